@@ -14,14 +14,66 @@ class Settings(BaseSettings):
     SIEM_INGEST_POLL_SECONDS: int = 2
     SIEM_INGEST_BATCH_SIZE: int = 200
     SIEM_INGEST_MAX_BATCHES_PER_FILE: int = 50
+    SIEM_INGEST_FAST_PARSE: bool = True
+    SIEM_INGEST_READ_CHUNK_BYTES: int = 1048576
+    SIEM_INGEST_MMAP_MIN_BYTES: int = 0
+    SIEM_INGEST_ARCHIVES_ENABLED: bool = False
+    SIEM_INGEST_KEEP_FILES_OPEN: bool = True
+    SIEM_INGEST_MAX_OPEN_FILES: int = 256
+    SIEM_INGEST_PARSE_WORKERS: int = 0
+    SIEM_INGEST_READER_THREADS: int = 4
+    SIEM_INGEST_PIPELINE_QUEUE_SIZE: int = 32
+    SIEM_INGEST_WATCH_ENABLED: bool = False
+    SIEM_INGEST_WATCH_DEBOUNCE_MS: int = 500
+    SIEM_INGEST_RESCAN_SECONDS: int = 300
+    SIEM_INGEST_GROUP_COMMIT_ENABLED: bool = False
+    SIEM_INGEST_GROUP_COMMIT_MAX_EVENTS: int = 5000
+    SIEM_INGEST_GROUP_COMMIT_MAX_LATENCY_MS: int = 1000
+    SIEM_INGEST_ADAPTIVE_BATCH_ENABLED: bool = False
+    SIEM_INGEST_ADAPTIVE_TARGET_MS: int = 250
+    SIEM_INGEST_ADAPTIVE_MIN_BATCH_SIZE: int = 50
+    SIEM_INGEST_ADAPTIVE_MAX_BATCH_SIZE: int = 20000
+    SIEM_INGEST_PUSH_ENABLED: bool = False
+    SIEM_INGEST_PUSH_TOKEN: str | None = None
+    SIEM_INGEST_PUSH_QUEUE_EVENTS: int = 200000
+    SIEM_INGEST_PUSH_MAX_BODY_BYTES: int = 16777216
+    SIEM_INGEST_PUSH_MAX_LATENCY_MS: int = 200
+    SIEM_INGEST_SOCKET_PATH: str | None = None
+    SIEM_INGEST_TCP_HOST: str = "127.0.0.1"
+    SIEM_INGEST_TCP_PORT: int | None = None
+    SIEM_INGEST_SOCKET_MAX_LINE_BYTES: int = 1048576
+    SIEM_SQLITE_JOURNAL_MODE: str = "WAL"
+    SIEM_SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SIEM_SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SIEM_SQLITE_CACHE_SIZE_KB: int = 65536
+    SIEM_SQLITE_MMAP_SIZE: int = 268435456
+    SIEM_SQLITE_TEMP_STORE: str = "MEMORY"
+    SIEM_SQLITE_WAL_AUTOCHECKPOINT: int = 1000
+    SIEM_SQLITE_WRITE_STATEMENT_CACHE: int = 128
+    SIEM_SQLITE_READ_POOL_SIZE: int = 8
+    SIEM_SQLITE_READ_POOL_MAX_OVERFLOW: int = 32
+    SIEM_SQLITE_READ_POOL_TIMEOUT_SECONDS: int = 30
+    SIEM_SQLITE_READ_STATEMENT_CACHE: int = 256
+    SIEM_FTS_ENABLED: bool = False
+    SIEM_PARTITION_ENABLED: bool = False
+    SIEM_PARTITION_DAYS: int = 1
     SIEM_MAX_MESSAGE_LEN: int = 5000
     SIEM_MAX_USER_AGENT_LEN: int = 2000
     SIEM_MAX_HTTP_PATH_LEN: int = 2000
     SIEM_MAX_RAW_JSON_LEN: int = 200000
     SIEM_MAX_DATA_JSON_LEN: int = 50000
+    SIEM_PAYLOAD_COMPRESSION_LEVEL: int = 6
+    SIEM_RAW_JSON_FROM_SOURCE: bool = False
+    SIEM_SOURCE_FILE_CACHE_SIZE: int = 16
+    SIEM_DICT_CACHE_SIZE: int = 100000
     SIEM_RENENTION_DAYS: int = 30
     SIEM_RENENTION_ENABLED: bool = True
     SIEM_RENENTION_RUN_EVERY_SECONDS: int = 3600
+    SIEM_RETENTION_APP_DAYS: dict[str, int] = {}
+    SIEM_RETENTION_CHUNK_ROWS: int = 5000
+    SIEM_RETENTION_CHUNKS_PER_CYCLE: int = 20
+    SIEM_RETENTION_CHUNK_PAUSE_MS: int = 10
+    SIEM_RETENTION_VACUUM_PAGES: int = 2048
 
     model_config: ClassVar[SettingsConfigDict] = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8"
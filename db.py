@@ -1,14 +1,341 @@
+import os
+import sqlite3
 from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import sessionmaker
 from config import settings
+from repositories import partitions
+from repositories.dictionary import values
+from repositories.fts import create_fts, drop_fts
+from repositories.payloads import create_payloads, move_inline_payloads
+from schemas.event import DICT_COLUMNS
 
 sqlite_url = f"sqlite:///{settings.SIEM_DB_PATH}"
-connect_args = {"check_same_thread": False}
-db_engine = create_engine(sqlite_url, echo=False, connect_args=connect_args)
+
+# SQLite allows one writer at a time, so ingest, retention and migrations
+# share a single connection; API queries get their own pool of read-only
+# connections and never queue behind it.
+db_engine = create_engine(
+    sqlite_url,
+    echo=False,
+    connect_args={
+        "check_same_thread": False,
+        "cached_statements": settings.SIEM_SQLITE_WRITE_STATEMENT_CACHE,
+    },
+    pool_size=1,
+    max_overflow=0,
+)
+read_engine = create_engine(
+    sqlite_url,
+    echo=False,
+    connect_args={
+        "check_same_thread": False,
+        "cached_statements": settings.SIEM_SQLITE_READ_STATEMENT_CACHE,
+    },
+    pool_size=settings.SIEM_SQLITE_READ_POOL_SIZE,
+    max_overflow=settings.SIEM_SQLITE_READ_POOL_MAX_OVERFLOW,
+    pool_timeout=settings.SIEM_SQLITE_READ_POOL_TIMEOUT_SECONDS,
+)
+
+
+def storage_pragmas() -> list[str]:
+    """Storage profile applied to every new connection, journal mode first."""
+    return [
+        f"PRAGMA journal_mode={settings.SIEM_SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SIEM_SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SIEM_SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size={-settings.SIEM_SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={settings.SIEM_SQLITE_MMAP_SIZE}",
+        f"PRAGMA temp_store={settings.SIEM_SQLITE_TEMP_STORE}",
+        f"PRAGMA wal_autocheckpoint={settings.SIEM_SQLITE_WAL_AUTOCHECKPOINT}",
+    ]
+
+
+@event.listens_for(db_engine, "connect")
+def _apply_storage_pragmas(dbapi_conn: sqlite3.Connection, _record: object) -> None:
+    for pragma in storage_pragmas():
+        _ = dbapi_conn.execute(pragma)
+
+
+@event.listens_for(read_engine, "connect")
+def _apply_read_pragmas(dbapi_conn: sqlite3.Connection, _record: object) -> None:
+    # journal_mode is a property of the database file, set by the writer.
+    for pragma in storage_pragmas()[1:]:
+        _ = dbapi_conn.execute(pragma)
+    _ = dbapi_conn.execute("PRAGMA query_only=ON")
+
+
+@event.listens_for(db_engine, "commit")
+def _keep_dictionary_values(_conn: Connection) -> None:
+    values.commit()
+
+
+@event.listens_for(db_engine, "rollback")
+def _forget_uncommitted(_conn: Connection) -> None:
+    partitions.forget_ensured()
+    values.rollback()
+
+
+def wal_size_bytes() -> int:
+    try:
+        return os.path.getsize(f"{settings.SIEM_DB_PATH}-wal")
+    except OSError:
+        return 0
+
+
+def wal_checkpoint(conn: Connection) -> tuple[int, int] | None:
+    """
+    Runs a PASSIVE checkpoint, which never waits on readers or the writer,
+    and returns (frames in the WAL, frames checkpointed). None when the
+    database is not in WAL mode.
+    """
+    row = conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").one()
+    if row[1] < 0:
+        return None
+    return int(row[1]), int(row[2])
+
+
 SessionLocal = sessionmaker(
     bind=db_engine, class_=Session, autoflush=False, expire_on_commit=False
 )
+ReadSessionLocal = sessionmaker(
+    bind=read_engine, class_=Session, autoflush=False, expire_on_commit=False
+)
+
+
+# Columns added after a table was first released; create_all only creates
+# missing tables, so existing databases get them via ALTER TABLE.
+_ADDED_COLUMNS: tuple[tuple[str, str, str], ...] = (
+    ("file_offsets", "completed_at", "VARCHAR"),
+    ("file_offsets", "generation", "INTEGER"),
+    ("events", "source_generation", "INTEGER NOT NULL DEFAULT 0"),
+    ("events", "ts_us", "INTEGER"),
+    *(("events", f"{column}_id", "INTEGER") for column in DICT_COLUMNS),
+    ("dict_values", "last_ts_us", "INTEGER"),
+)
+
+# Before events_source_line existed the same line could be stored twice.
+# Exact copies are dropped; rows that only share file and offset came from
+# different files at the same path (rotation) and are numbered apart in
+# insertion order.
+_SOURCE_LINE_MIGRATION: tuple[str, ...] = (
+    """
+    DELETE FROM events WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY source_file, source_offset, raw_json ORDER BY id
+            ) AS copy
+            FROM events WHERE source_file IS NOT NULL
+        ) WHERE copy > 1
+    )
+    """,
+    """
+    UPDATE events SET source_generation = numbered.generation
+    FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY source_file, source_offset ORDER BY id
+        ) - 1 AS generation
+        FROM events WHERE source_file IS NOT NULL
+    ) AS numbered
+    WHERE events.id = numbered.id AND numbered.generation > 0
+    """,
+    """
+    UPDATE file_offsets SET generation = (
+        SELECT coalesce(max(source_generation), 0) FROM events
+        WHERE events.source_file = file_offsets.path
+    )
+    """,
+)
+
+# ts is always written by dt_to_utc_rfc3339_z, so a fraction has six digits.
+_TS_US_FILL = (
+    "UPDATE {table} SET ts_us = CAST(strftime('%s', ts) AS INTEGER) * 1000000 + "
+    "CASE WHEN substr(ts, 20, 1) = '.' THEN CAST(substr(ts, 21, 6) AS INTEGER) "
+    "ELSE 0 END WHERE ts_us IS NULL"
+)
+
+# Data fixes that must run before an index added to an existing table can be
+# built; every declared index missing from the database is created on start.
+_INDEX_MIGRATIONS: dict[str, tuple[str, ...]] = {
+    "events_ts_us": (_TS_US_FILL.format(table="events"),),
+}
+
+# The same for partitions, keyed by the index name without the table name.
+_PARTITION_INDEX_MIGRATIONS: dict[str, tuple[str, ...]] = {
+    "_ts_us": (_TS_US_FILL,),
+}
+
+# Indexes of events (and its partitions) replaced by others, without the
+# table name.
+_DROPPED_INDEXES: tuple[str, ...] = (
+    "_ts_desc",
+    "_app_ts",
+    "_event_type_ts",
+    "_src_ip_ts",
+    "_user_id_ts",
+)
 
 
 def init_db():
+    with db_engine.connect() as conn:
+        tables = conn.exec_driver_sql("SELECT count(*) FROM sqlite_master").scalar()
+        if not tables:
+            # Lets retention hand freed pages back to the filesystem with
+            # incremental_vacuum. Only possible before the first table
+            # exists; VACUUM applies it to the already initialised header.
+            _ = conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            _ = conn.exec_driver_sql("VACUUM")
     SQLModel.metadata.create_all(db_engine)
+    with db_engine.begin() as conn:
+        for table, column, column_type in _ADDED_COLUMNS:
+            _add_missing_column(conn, table, column, column_type)
+
+        if "app" in _column_names(conn, "events"):
+            if "events_source_line" not in _index_names(conn):
+                for statement in _SOURCE_LINE_MIGRATION:
+                    _ = conn.exec_driver_sql(statement)
+            _encode_dict_columns(conn, "events")
+        _create_payloads(conn, "events")
+
+        _create_missing_indexes(conn)
+        _drop_replaced_indexes(conn, "events")
+
+        if settings.SIEM_PARTITION_ENABLED:
+            _migrate_partitions(conn)
+        _fill_dict_last_ts(conn)
+
+        _sync_fts(conn)
+
+
+def _column_names(conn: Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _add_missing_column(
+    conn: Connection, table: str, column: str, column_type: str
+) -> None:
+    if column not in _column_names(conn, table):
+        _ = conn.exec_driver_sql(
+            f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"
+        )
+
+
+def _migrate_partitions(conn: Connection) -> None:
+    # Partitions are copies of events, so they get its new columns and
+    # indexes too.
+    for day in partitions.list_partitions(conn):
+        partition = partitions.partition_table(day)
+        for table, column, column_type in _ADDED_COLUMNS:
+            if table == "events":
+                _add_missing_column(conn, partition.name, column, column_type)
+        if "app" in _column_names(conn, partition.name):
+            _encode_dict_columns(conn, partition.name)
+        _create_payloads(conn, partition.name)
+        existing = _index_names(conn)
+        for index in partition.indexes:
+            if index.name in existing:
+                continue
+            suffix = str(index.name)[len(partition.name) :]
+            for statement in _PARTITION_INDEX_MIGRATIONS.get(suffix, ()):
+                _ = conn.exec_driver_sql(statement.format(table=partition.name))
+            index.create(conn)
+        _drop_replaced_indexes(conn, partition.name)
+
+    moved = partitions.migrate_into_partitions(conn)
+    if moved:
+        print(f"[db] moved {moved} events into partitions")
+
+
+def _encode_dict_columns(conn: Connection, table: str) -> None:
+    """
+    Replaces the DICT_COLUMNS strings of a table written before they were
+    dictionary-encoded by ids. Its indexes are dropped, since they may use
+    the strings, and created again afterwards.
+    """
+    print(f"[db] encoding {', '.join(DICT_COLUMNS)} of {table}")
+    for column in DICT_COLUMNS:
+        _ = conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO dict_values (kind, value) "
+            f"SELECT DISTINCT ?, {column} FROM {table} WHERE {column} IS NOT NULL",
+            (column,),
+        )
+        _ = conn.exec_driver_sql(
+            f"UPDATE {table} SET {column}_id = ("
+            f"SELECT id FROM dict_values WHERE kind = ? AND value = {table}.{column}"
+            f") WHERE {column} IS NOT NULL",
+            (column,),
+        )
+    indexes = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table,),
+    ).scalars()
+    for index in list(indexes):
+        _ = conn.exec_driver_sql(f"DROP INDEX {index}")
+    for column in DICT_COLUMNS:
+        _ = conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+
+def _fill_dict_last_ts(conn: Connection) -> None:
+    # Values stored before last_ts_us existed may be used by any event, so
+    # they count as used up to just past the newest one.
+    tables = [
+        "events",
+        *map(partitions.partition_name, partitions.list_partitions(conn)),
+    ]
+    newest = [
+        conn.exec_driver_sql(f"SELECT max(ts_us) FROM {table}").scalar()
+        for table in tables
+    ]
+    _ = conn.exec_driver_sql(
+        "UPDATE dict_values SET last_ts_us = ? WHERE last_ts_us IS NULL",
+        (max((us + 1 for us in newest if us is not None), default=0),),
+    )
+
+
+def _create_payloads(conn: Connection, table: str) -> None:
+    create_payloads(conn, table)
+    if "raw_json" in _column_names(conn, table):
+        print(f"[db] moving data_json and raw_json of {table} to its payload table")
+        move_inline_payloads(conn, table, settings.SIEM_PAYLOAD_COMPRESSION_LEVEL)
+
+
+def _sync_fts(conn: Connection) -> None:
+    # Triggers keep the index up to date, so it is dropped when disabled
+    # rather than left to slow down every insert.
+    tables = ["events"]
+    if settings.SIEM_PARTITION_ENABLED:
+        tables += [
+            partitions.partition_name(day) for day in partitions.list_partitions(conn)
+        ]
+    for table in tables:
+        if not settings.SIEM_FTS_ENABLED:
+            drop_fts(conn, table)
+        elif create_fts(conn, table):
+            print(f"[db] built full-text index for {table}")
+
+
+def _index_names(conn: Connection) -> set[str]:
+    return {
+        row[0]
+        for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+
+
+def _drop_replaced_indexes(conn: Connection, table: str) -> None:
+    for suffix in _DROPPED_INDEXES:
+        _ = conn.exec_driver_sql(f"DROP INDEX IF EXISTS {table}{suffix}")
+
+
+def _create_missing_indexes(conn: Connection) -> None:
+    existing = _index_names(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            for statement in _INDEX_MIGRATIONS.get(str(index.name), ()):
+                _ = conn.exec_driver_sql(statement)
+            index.create(conn)
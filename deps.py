@@ -1,3 +1,4 @@
+import hmac
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
@@ -26,8 +27,28 @@ def require_admin(
     if credentials.scheme.lower() != "bearer":
         raise _unauthorized()
 
+    _require_admin_token(credentials.credentials)
+
+
+def require_ingest(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(_http_bearer)],
+) -> None:
+    """Admin JWT, or SIEM_INGEST_PUSH_TOKEN for services that only push events."""
+    if credentials is None:
+        raise _unauthorized()
+
+    if credentials.scheme.lower() != "bearer":
+        raise _unauthorized()
+
     token = credentials.credentials
+    push_token = settings.SIEM_INGEST_PUSH_TOKEN
+    if push_token and hmac.compare_digest(token.encode(), push_token.encode()):
+        return
+
+    _require_admin_token(token)
+
 
+def _require_admin_token(token: str) -> None:
     try:
         payload = jwt.decode(
             token, settings.SIEM_JWT_SECRET, algorithms=[settings.SIEM_JWT_ALG]
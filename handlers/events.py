@@ -1,14 +1,89 @@
+from collections.abc import Sequence
 from datetime import datetime
+from typing import Any, TypeVar
 from sqlalchemy import and_, or_
-from sqlalchemy.orm import defer
 from sqlmodel import Session, select, col
 
+from config import settings
 from handlers.exceptions import EventDetailsNotFound
 from models.models import Event
-from ingest.utils import dt_to_utc_rfc3339_z
+from ingest.utils import cap_text, decode_jsonl_line, dt_to_epoch_us
+from repositories.dictionary import values
+from repositories.file_offsets import get_offset
+from repositories.fts import match_expression, match_ids
+from repositories.partitions import (
+    day_us,
+    list_partitions,
+    partition_entity,
+    partition_for_id,
+    partition_ranges,
+    partition_table,
+)
+from repositories.payloads import load_payload
+from repositories.source_files import source_files
+from schemas.apiResponse import EventDetail, EventListItem
+from schemas.event import DICT_COLUMNS
 
 MAX_LIMIT = 500
 
+_Api = TypeVar("_Api", EventListItem, EventDetail)
+
+
+def _decode(
+    session: Session,
+    events: Sequence[Event],
+    model: type[_Api],
+    **extra: Any,
+) -> list[_Api]:
+    """
+    Builds API models, looking up the strings of dictionary-encoded columns.
+    extra sets fields the events table does not hold.
+    """
+    strings = values.values_of(
+        session.connection(),
+        (getattr(e, f"{column}_id") for e in events for column in DICT_COLUMNS),
+    )
+    decoded: list[_Api] = []
+    for e in events:
+        fields: dict[str, Any] = {}
+        for name in model.model_fields:
+            if name in extra:
+                fields[name] = extra[name]
+            elif name in DICT_COLUMNS:
+                id = getattr(e, f"{name}_id")
+                fields[name] = None if id is None else strings.get(id)
+            else:
+                fields[name] = getattr(e, name)
+        decoded.append(model(**fields))
+    return decoded
+
+
+def _raw_json_from_source(
+    session: Session, detail: EventDetail, source_generation: int
+) -> str | None:
+    """
+    Reads the line of an event stored without raw_json from its log file.
+    None once the file it came from is no longer at source_file.
+    """
+    if detail.source_file is None or detail.source_offset is None:
+        return None
+    saved = get_offset(session, detail.source_file)
+    if saved is None or saved.inode is None:
+        return None
+    if (saved.generation or 0) != source_generation:
+        return None
+    max_len = settings.SIEM_MAX_RAW_JSON_LEN
+    line = source_files.read_line(
+        detail.source_file,
+        saved.inode,
+        detail.source_offset,
+        # Up to four bytes per character in UTF-8.
+        max_len * 4 if max_len > 0 else 0,
+    )
+    if line is None:
+        return None
+    return cap_text(decode_jsonl_line(line), max_len)
+
 
 def get_events_all(
     session: Session,
@@ -28,56 +103,114 @@ def get_events_all(
 ):
     limit = max(1, min(limit, MAX_LIMIT))
 
-    stmt = select(Event).options(defer(Event.raw_json), defer(Event.data_json))
-
-    if from_ is not None:
-        from_str = dt_to_utc_rfc3339_z(from_)
-        stmt = stmt.where(Event.ts >= from_str)
-    if to is not None:
-        to_str = dt_to_utc_rfc3339_z(to)
-        stmt = stmt.where(Event.ts <= to_str)
-
-    if app:
-        stmt = stmt.where(col(Event.app).in_(app))
-    if event_type:
-        stmt = stmt.where(col(Event.event_type).in_(event_type))
-    if level:
-        stmt = stmt.where(col(Event.level).in_(level))
-
-    if user_id is not None:
-        stmt = stmt.where(Event.user_id == user_id)
-    if src_ip is not None:
-        stmt = stmt.where(Event.src_ip == src_ip)
-    if request_id is not None:
-        stmt = stmt.where(Event.request_id == request_id)
-    if http_status is not None:
-        stmt = stmt.where(Event.http_status == http_status)
-
-    if q is not None:
-        stmt = stmt.where(
-            or_(col(Event.message).contains(q), col(Event.http_path).contains(q))
-        )
-
     if before_ts is not None or before_id is not None:
         if before_ts is None or before_id is None:
             raise ValueError("before_ts and before_id must be provided together")
 
-        before_ts_str = dt_to_utc_rfc3339_z(before_ts)
-        stmt = stmt.where(
-            or_(
-                col(Event.ts) < before_ts_str,
-                and_(col(Event.ts) == before_ts_str, col(Event.id) < before_id),
+    from_us = dt_to_epoch_us(from_) if from_ is not None else None
+    to_us = dt_to_epoch_us(to) if to is not None else None
+    before_ts_us = dt_to_epoch_us(before_ts) if before_ts is not None else None
+    fts_query = None
+    if q is not None and settings.SIEM_FTS_ENABLED:
+        fts_query = match_expression(q)
+
+    conn = session.connection()
+    app_ids = values.ids_of(conn, "app", app) if app else []
+    event_type_ids = values.ids_of(conn, "event_type", event_type) if event_type else []
+    level_ids = values.ids_of(conn, "level", level) if level else []
+    # A value never stored cannot match any event.
+    if (app and not app_ids) or (event_type and not event_type_ids):
+        return []
+    if level and not level_ids:
+        return []
+
+    def query(entity: Any, table_name: str, limit: int):
+        stmt = select(entity)
+
+        if from_us is not None:
+            stmt = stmt.where(entity.ts_us >= from_us)
+        if to_us is not None:
+            stmt = stmt.where(entity.ts_us <= to_us)
+
+        if app_ids:
+            stmt = stmt.where(col(entity.app_id).in_(app_ids))
+        if event_type_ids:
+            stmt = stmt.where(col(entity.event_type_id).in_(event_type_ids))
+        if level_ids:
+            stmt = stmt.where(col(entity.level_id).in_(level_ids))
+
+        if user_id is not None:
+            stmt = stmt.where(entity.user_id == user_id)
+        if src_ip is not None:
+            stmt = stmt.where(entity.src_ip == src_ip)
+        if request_id is not None:
+            stmt = stmt.where(entity.request_id == request_id)
+        if http_status is not None:
+            stmt = stmt.where(entity.http_status == http_status)
+
+        if fts_query is not None:
+            stmt = stmt.where(col(entity.id).in_(match_ids(table_name, fts_query)))
+        elif q is not None:
+            stmt = stmt.where(
+                or_(col(entity.message).contains(q), col(entity.http_path).contains(q))
+            )
+
+        if before_ts_us is not None:
+            stmt = stmt.where(
+                or_(
+                    col(entity.ts_us) < before_ts_us,
+                    and_(col(entity.ts_us) == before_ts_us, col(entity.id) < before_id),
+                )
             )
+
+        stmt = stmt.order_by(col(entity.ts_us).desc(), col(entity.id).desc()).limit(
+            limit
         )
+        return session.exec(stmt).all()
 
-    stmt = stmt.order_by(col(Event.ts).desc(), col(Event.id).desc()).limit(limit)
+    if not settings.SIEM_PARTITION_ENABLED:
+        return _decode(session, query(Event, Event.__tablename__, limit), EventListItem)
 
-    events_list = session.exec(stmt).all()
-    return events_list
+    # Partitions hold disjoint ts ranges, so walking them newest first and
+    # stopping once the page is full keeps the ts DESC, id DESC order.
+    upper = min((us for us in (to_us, before_ts_us) if us is not None), default=None)
+    events_list: list[Event] = []
+    for day, end in reversed(partition_ranges(list_partitions(session.connection()))):
+        if upper is not None and day_us(day) > upper:
+            continue
+        if from_us is not None and day_us(end) <= from_us:
+            break
+        events_list.extend(
+            query(
+                partition_entity(day),
+                partition_table(day).name,
+                limit - len(events_list),
+            )
+        )
+        if len(events_list) >= limit:
+            break
+    return _decode(session, events_list, EventListItem)
 
 
-def get_event_details(id: int, session: Session) -> Event:
-    event_details = session.get(Event, id)
+def get_event_details(id: int, session: Session) -> EventDetail:
+    if settings.SIEM_PARTITION_ENABLED:
+        day = partition_for_id(id)
+        if day not in list_partitions(session.connection()):
+            raise EventDetailsNotFound(id)
+        entity = partition_entity(day)
+        event_details = session.exec(select(entity).where(entity.id == id)).first()
+        table_name = partition_table(day).name
+    else:
+        event_details = session.get(Event, id)
+        table_name = Event.__tablename__
     if event_details is None:
         raise EventDetailsNotFound(id)
-    return event_details
+    data_json, raw_json = load_payload(session.connection(), table_name, id)
+    detail = _decode(
+        session, [event_details], EventDetail, data_json=data_json, raw_json=raw_json
+    )[0]
+    if detail.raw_json is None:
+        detail.raw_json = _raw_json_from_source(
+            session, detail, event_details.source_generation
+        )
+    return detail
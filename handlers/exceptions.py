@@ -79,3 +79,19 @@ class IngestorStaleError(ReadyCheckError):
 class MetricsUnavailableError(Exception):
     def __init__(self, message: str = "Metrics not available"):
         super().__init__(message)
+
+
+class PushUnavailableError(Exception):
+    def __init__(self, message: str = "Push ingest is not running"):
+        super().__init__(message)
+
+
+class PushQueueFullError(Exception):
+    def __init__(self, message: str = "Ingest queue is full, retry later"):
+        super().__init__(message)
+
+
+class PushTooLargeError(Exception):
+    def __init__(self, limit: int, unit: str):
+        self.limit: int = limit
+        super().__init__(f"Request exceeds {limit} {unit}")
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import cast
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from handlers.exceptions import (
+    PushQueueFullError,
+    PushTooLargeError,
+    PushUnavailableError,
+)
+from ingest.normalize import build_context
+from ingest.push import NdjsonBatch
+from schemas.appState import PushAppState
+from schemas.ingest import PushResult
+
+
+async def push_ndjson(request: Request, app: str | None) -> PushResult:
+    queue = cast(PushAppState, request.app.state).push_queue
+    if not settings.SIEM_INGEST_PUSH_ENABLED or queue is None or queue.closed:
+        raise PushUnavailableError()
+
+    # Refuse before reading the body so a backed-up writer costs clients
+    # as little as possible.
+    if not queue.has_room():
+        queue.reject()
+        raise PushQueueFullError()
+
+    batch = NdjsonBatch(build_context(app, None), settings.SIEM_INGEST_FAST_PARSE)
+    max_body = settings.SIEM_INGEST_PUSH_MAX_BODY_BYTES
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_body:
+            raise PushTooLargeError(max_body, "bytes")
+        if chunk:
+            await run_in_threadpool(batch.feed, chunk)
+    batch.finish()
+
+    if len(batch.events) > queue.max_events:
+        raise PushTooLargeError(queue.max_events, "events")
+    if not queue.offer(batch.events):
+        queue.reject()
+        raise PushQueueFullError()
+
+    return PushResult(accepted=len(batch.events), stats=batch.stats)
@@ -1,38 +1,59 @@
-import os
+from typing import cast
 
+from fastapi import Request
+from sqlalchemy import union
 from sqlmodel import select, Session, col
 
-
+from config import settings
 from handlers.exceptions import LogDirUnavailableError
 from models.models import Event
+from repositories.dictionary import values
+from repositories.partitions import list_partitions, partition_table
+from schemas.appState import MetadataAppState
 
 
-def get_apps_from_fs(log_dir: str) -> list[str]:
-    try:
-        apps: list[str] = []
-        with os.scandir(log_dir) as it:
-            for entry in it:
-                if entry.name.startswith("."):
-                    continue
-                if entry.is_dir(follow_symlinks=False):
-                    apps.append(entry.name)
-        apps.sort(key=str.casefold)
-        return apps
-    except (FileNotFoundError, PermissionError) as e:
-        raise LogDirUnavailableError(log_dir) from e
+def get_apps_from_index(request: Request) -> list[str]:
+    index = cast(MetadataAppState, request.app.state).discovery_index
+    index.ensure_fresh(settings.SIEM_INGEST_RESCAN_SECONDS)
+    apps = index.apps
+    if not index.log_dir_exists or apps is None:
+        raise LogDirUnavailableError(str(index.log_dir))
+    return list(apps)
 
 
 def get_event_types_handler(session: Session, app: str | None = None) -> list[str]:
-    stmt = (
-        select(Event.event_type)
-        .where(col(Event.event_type).is_not(None))
-        .where(col(Event.event_type) != "")
-        .distinct()
-        .order_by(col(Event.event_type))
-    )
-
+    conn = session.connection()
+    app_id = None
     if app is not None:
-        stmt = stmt.where(Event.app == app)
-
-    rows = session.exec(stmt).all()
-    return [et for et in rows if et is not None and et != ""]
+        app_ids = values.ids_of(conn, "app", [app])
+        if not app_ids:
+            return []
+        app_id = app_ids[0]
+
+    if settings.SIEM_PARTITION_ENABLED:
+        ids = _get_partitioned_event_type_ids(session, app_id)
+    else:
+        stmt = (
+            select(Event.event_type_id)
+            .where(col(Event.event_type_id).is_not(None))
+            .distinct()
+        )
+        if app_id is not None:
+            stmt = stmt.where(Event.app_id == app_id)
+        ids = list(session.exec(stmt).all())
+
+    return sorted(et for et in values.values_of(conn, ids).values() if et != "")
+
+
+def _get_partitioned_event_type_ids(session: Session, app_id: int | None) -> list[int]:
+    selects = []
+    for day in list_partitions(session.connection()):
+        table = partition_table(day)
+        stmt = select(table.c.event_type_id).where(table.c.event_type_id.is_not(None))
+        if app_id is not None:
+            stmt = stmt.where(table.c.app_id == app_id)
+        selects.append(stmt)
+    if not selects:
+        return []
+
+    return list(session.connection().execute(union(*selects)).scalars())
@@ -4,6 +4,7 @@ from typing import cast
 
 from fastapi import Request
 
+from db import wal_size_bytes
 from handlers.exceptions import MetricsUnavailableError
 from schemas.appState import MetricsAppState
 from schemas.ingest import (
@@ -22,4 +23,11 @@ def get_metrics_handler(request: Request) -> IngestState:
     app_state = cast(MetricsAppState, raw_state)
 
     with app_state.ingest_lock:
-        return app_state.ingest_state.model_copy(deep=True)
+        state = app_state.ingest_state.model_copy(deep=True)
+
+    state.storage.wal_bytes = wal_size_bytes()
+    if app_state.push_queue is not None:
+        state.push = app_state.push_queue.snapshot()
+        if app_state.socket_receiver is not None:
+            state.push.socket_connections = app_state.socket_receiver.connections
+    return state
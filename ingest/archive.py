@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import gzip
+import re
+from types import ModuleType
+from typing import BinaryIO
+
+zstandard: ModuleType | None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# a.jsonl.gz, a.jsonl.1.gz, a.jsonl-20240101.zst, ...
+_ARCHIVE_RE = re.compile(
+    r"\.jsonl(?:[.-][\w.-]*)?\.(?:gz|zst)$"
+    if zstandard is not None
+    else r"\.jsonl(?:[.-][\w.-]*)?\.gz$"
+)
+
+_ZSTD_READ_BYTES = 131072
+
+
+def is_archive_path(path: str) -> bool:
+    return _ARCHIVE_RE.search(path) is not None
+
+
+class _ZstdReader:
+    def __init__(self, f: BinaryIO) -> None:
+        assert zstandard is not None
+        self.f: BinaryIO = f
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._frame = self._decompressor.decompressobj()
+        self._in_frame: bool = False
+        self._buffer: bytes = b""
+
+    def read(self, size: int) -> bytes:
+        while self._buffer == b"":
+            data = self.f.read(_ZSTD_READ_BYTES)
+            if data == b"":
+                if self._in_frame:
+                    raise EOFError("zstd archive ended before the end of its frame")
+                return b""
+            while data:
+                self._in_frame = True
+                self._buffer += self._frame.decompress(data)
+                data = b""
+                if self._frame.eof:
+                    data = self._frame.unused_data
+                    self._frame = self._decompressor.decompressobj()
+                    self._in_frame = False
+
+        chunk = self._buffer[:size] if size >= 0 else self._buffer
+        self._buffer = self._buffer[len(chunk) :]
+        return chunk
+
+    def close(self) -> None:
+        pass
+
+
+class ArchiveStream:
+    """
+    Forward-only decompressed view of a .jsonl.gz / .jsonl.zst file.
+
+    read() returns b"" both at the real end of the archive and when it is cut
+    short (logrotate may still be compressing it); only the former sets
+    finished. At the real end a newline is added after a last line that lacks
+    one, so that line is handed out as well.
+    """
+
+    def __init__(self, f: BinaryIO, path: str, finished: bool = False) -> None:
+        self.finished: bool = finished
+        self._ended: bool = finished
+        self._last_byte: bytes = b"\n"
+        self._pending: bytes = b""
+        self._stream: gzip.GzipFile | _ZstdReader | None = None
+        if finished:
+            return
+        if path.endswith(".zst"):
+            self._stream = _ZstdReader(f)
+        else:
+            self._stream = gzip.GzipFile(fileobj=f, mode="rb")
+
+    def peek(self, size: int) -> bytes:
+        while len(self._pending) < size:
+            chunk = self._read(size - len(self._pending))
+            if chunk == b"":
+                break
+            self._pending += chunk
+        return self._pending[:size]
+
+    def read(self, size: int = -1) -> bytes:
+        if self._pending:
+            chunk = self._pending if size < 0 else self._pending[:size]
+            self._pending = self._pending[len(chunk) :]
+            return chunk
+        return self._read(size)
+
+    def _read(self, size: int) -> bytes:
+        if self._ended or self._stream is None:
+            return b""
+        try:
+            chunk = self._stream.read(size)
+        except EOFError:
+            self._ended = True
+            return b""
+        if chunk == b"":
+            self._ended = True
+            self.finished = True
+            return b"" if self._last_byte == b"\n" else b"\n"
+        self._last_byte = chunk[-1:]
+        return chunk
+
+    def skip(self, count: int) -> int:
+        skipped = 0
+        while skipped < count:
+            chunk = self.read(min(count - skipped, 1048576))
+            if chunk == b"":
+                break
+            skipped += len(chunk)
+        return skipped
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
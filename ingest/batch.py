@@ -1,93 +1,330 @@
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
+import threading
+from time import monotonic
+from typing import Callable
+from sqlmodel import Session
+from schemas.event import EventRow
 from schemas.ingest import BatchResult, FileResult, Stats
-from db import SessionLocal
-from repositories.events import insert_events_batch
-from repositories.file_offsets import upsert_offset, get_offset
-from .tail import read_new_lines_since_last_offset
+from repositories.events import insert_event_rows
+from repositories.file_offsets import (
+    get_fingerprint_offset,
+    get_offset,
+    upsert_fingerprint,
+    upsert_offset,
+)
+from .tail import FileTail, TailCache
 
 
-def ingest_one_batch_for_file(path: str, batch_size: int) -> BatchResult:
-    path_key = str(Path(path).resolve())
-    session = SessionLocal()
-    prev_offset = 0
-    prev_inode: int | None = None
-    stats = Stats()
-    try:
-        row = get_offset(session, path_key)
-        if row:
-            prev_offset = row.offset or 0
-            prev_inode = row.inode
-        tail_result = read_new_lines_since_last_offset(
-            session, path_key, max_events=batch_size
-        )
-        events = tail_result.events
-        offset = tail_result.new_offset
-        inode = tail_result.inode
-        stats = tail_result.stats
-
-        if inode is None:
-            session.close()
-            return BatchResult(
-                inserted_count=0, new_offset=0, inode=0, progressed=False, stats=stats
-            )
-        inserted_count = len(events)
-        if inserted_count > 0:
-            _ = insert_events_batch(session, events)
-
-        now_iso_utc = (
-            datetime.now(timezone.utc)
-            .replace(microsecond=0)
-            .isoformat()
-            .replace("+00:00", "Z")
-        )
-        progressed = (row is None) or (offset != prev_offset) or (inode != prev_inode)
+def _now_iso_utc() -> str:
+    return (
+        datetime.now(timezone.utc)
+        .replace(microsecond=0)
+        .isoformat()
+        .replace("+00:00", "Z")
+    )
 
-        if progressed:
-            upsert_offset(session, path_key, inode, offset, now_iso_utc)
 
-        if progressed or inserted_count != 0:
-            session.commit()
+class CommitGroup:
+    """
+    Collects event inserts and offset updates in one open transaction and
+    commits them together once max_events or max_latency_seconds is reached.
+    With max_events <= 0 every batch is committed on its own.
+    """
 
-        session.close()
-        return BatchResult(
-            inserted_count=inserted_count,
-            new_offset=offset,
-            inode=inode,
-            progressed=progressed,
-            stats=stats,
-        )
-    except Exception as e:
-        print(e)
-        session.rollback()
-        session.close()
-        return BatchResult(
-            inserted_count=0,
-            new_offset=prev_offset,
-            inode=prev_inode,
-            progressed=False,
-            stats=stats,
+    def __init__(
+        self, session: Session, max_events: int = 0, max_latency_seconds: float = 0
+    ) -> None:
+        self.session: Session = session
+        self.max_events: int = max_events
+        self.max_latency_seconds: float = max_latency_seconds
+        self.pending_events: int = 0
+        self.pending_writes: int = 0
+        self.opened_at: float | None = None
+        self.commit_count: int = 0
+        self._on_commit: list[Callable[[], None]] = []
+        self._on_rollback: list[Callable[[], None]] = []
+
+    def track(self, inserted_count: int, offset_written: bool) -> None:
+        if inserted_count == 0 and not offset_written:
+            return
+        if self.opened_at is None:
+            self.opened_at = monotonic()
+        self.pending_events += inserted_count
+        self.pending_writes += 1
+
+    def due(self) -> bool:
+        if self.pending_writes == 0:
+            return False
+        if self.max_events <= 0 or self.pending_events >= self.max_events:
+            return True
+        assert self.opened_at is not None
+        return monotonic() - self.opened_at >= self.max_latency_seconds
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        if self.pending_writes == 0:
+            callback()
+        else:
+            self._on_commit.append(callback)
+
+    def commit(self) -> None:
+        if self.pending_writes == 0:
+            return
+        self.session.commit()
+        self.commit_count += 1
+        callbacks = self._on_commit
+        self._reset()
+        for callback in callbacks:
+            callback()
+
+    def on_rollback(self, callback: Callable[[], None]) -> None:
+        self._on_rollback.append(callback)
+
+    def maybe_commit(self) -> None:
+        if self.due():
+            self.commit()
+
+    def rollback(self) -> None:
+        self.session.rollback()
+        self._reset()
+        for callback in self._on_rollback:
+            callback()
+
+    def _reset(self) -> None:
+        self.pending_events = 0
+        self.pending_writes = 0
+        self.opened_at = None
+        self._on_commit = []
+
+
+class BatchSizer:
+    """
+    Picks the batch size per file, in lines, so a batch (read, parse, insert
+    and any commit it triggers) takes about target_seconds. Keeps a moving
+    average of seconds per line for every file, grows at most 2x per batch
+    and only after a full batch, and shrinks only when a batch runs over
+    budget.
+    """
+
+    SMOOTHING: float = 0.3
+
+    def __init__(
+        self,
+        initial_size: int,
+        min_size: int,
+        max_size: int,
+        target_seconds: float,
+    ) -> None:
+        self.min_size: int = max(min_size, 1)
+        self.max_size: int = max(max_size, self.min_size)
+        self.initial_size: int = self._clamp(initial_size)
+        self.target_seconds: float = target_seconds
+        self._sizes: dict[str, int] = {}
+        self._cost: dict[str, float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def _clamp(self, size: int) -> int:
+        return min(max(size, self.min_size), self.max_size)
+
+    def size_for(self, path_key: str) -> int:
+        with self._lock:
+            return self._sizes.get(path_key, self.initial_size)
+
+    def record(
+        self, path_key: str, batch_size: int, line_count: int, elapsed: float
+    ) -> None:
+        if line_count <= 0:
+            return
+        with self._lock:
+            sample = elapsed / line_count
+            cost = self._cost.get(path_key)
+            cost = sample if cost is None else cost + self.SMOOTHING * (sample - cost)
+            self._cost[path_key] = cost
+
+            size = self._sizes.get(path_key, self.initial_size)
+            wanted = int(self.target_seconds / cost) if cost > 0 else self.max_size
+            if wanted > size and line_count >= batch_size:
+                size = min(wanted, size * 2)
+            elif wanted < size and elapsed > self.target_seconds:
+                size = wanted
+            self._sizes[path_key] = self._clamp(size)
+
+    def retain(self, path_keys: list[str]) -> None:
+        keep = set(path_keys)
+        with self._lock:
+            for path_key in [k for k in self._sizes if k not in keep]:
+                del self._sizes[path_key]
+            for path_key in [k for k in self._cost if k not in keep]:
+                del self._cost[path_key]
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._sizes)
+
+
+def write_batch(
+    group: CommitGroup,
+    tail: FileTail,
+    events: list[EventRow],
+    offset: int,
+    complete: bool = False,
+) -> tuple[int, bool]:
+    """
+    Inserts events and saves offset; returns how many events were inserted
+    (duplicates are skipped) and whether the saved offset moved.
+    """
+    session = group.session
+    inserted = insert_event_rows(session, events)
+
+    progressed = not tail.is_saved(offset, complete)
+    if progressed:
+        upsert_offset(
+            session,
+            tail.path_key,
+            tail.inode,
+            offset,
+            _now_iso_utc(),
+            complete,
+            tail.generation,
         )
+        tail.mark_saved(offset, complete)
+
+    # Stored on the first batch after opening too, not only on progress, so
+    # a file that rotates without growing again is still recognised.
+    fingerprinted = False
+    if tail.fingerprint is not None and (progressed or not tail.fingerprint_saved):
+        if progressed or get_fingerprint_offset(session, tail.fingerprint) != offset:
+            upsert_fingerprint(session, tail.fingerprint, offset, _now_iso_utc())
+            fingerprinted = True
+        tail.fingerprint_saved = True
+
+    group.track(inserted, progressed or fingerprinted)
+    group.maybe_commit()
+    return inserted, progressed
+
+
+def count_inserted(file_result: FileResult, inserted_count: int) -> None:
+    file_result.inserted_count += inserted_count
+
+
+def ingest_one_batch(group: CommitGroup, tail: FileTail, batch_size: int) -> BatchResult:
+    tail_result = tail.read_batch(max_lines=batch_size)
+    events = tail_result.events
+    inserted, progressed = write_batch(
+        group, tail, events, tail_result.new_offset, tail.complete
+    )
+
+    return BatchResult(
+        inserted_count=inserted,
+        new_offset=tail_result.new_offset,
+        inode=tail.inode,
+        line_count=tail_result.line_count,
+        progressed=progressed,
+        stats=tail_result.stats,
+    )
+
+
+def open_tail(
+    session: Session, path: str, tails: TailCache | None = None
+) -> FileTail | None:
+    path_key = str(Path(path).resolve())
+    if tails is not None:
+        cached = tails.take(path_key)
+        if cached is not None:
+            return cached
+
+    row = get_offset(session, path_key)
+    tail = FileTail.open(
+        path_key,
+        None if row is None else row.offset or 0,
+        None if row is None else row.inode,
+        row is not None and row.completed_at is not None,
+        0 if row is None else row.generation or 0,
+    )
+    # An archive seen for the first time continues where the live file it
+    # was rotated from stopped, so its tail is ingested without duplicates.
+    if (
+        tail is not None
+        and tail.archive is not None
+        and tail.fingerprint is not None
+        and tail.offset == 0
+        and (row is None or row.inode != tail.inode)
+    ):
+        origin_offset = get_fingerprint_offset(session, tail.fingerprint)
+        if origin_offset:
+            tail.skip_to(origin_offset)
+    return tail
 
 
 def ingest_file_caught_up(
-    path: str, batch_size: int, max_batches_per_file: int
+    path: str,
+    batch_size: int,
+    max_batches_per_file: int,
+    group: CommitGroup,
+    sizer: BatchSizer | None = None,
+    tails: TailCache | None = None,
 ) -> FileResult:
     file_result = FileResult(inserted_count=0, batch_count=0, stats=Stats())
-    remaining = max_batches_per_file
-    while True:
-        remaining -= 1
-        batch_result = ingest_one_batch_for_file(path, batch_size)
-        file_result.inserted_count += batch_result.inserted_count
+
+    tail = open_tail(group.session, path, tails)
+    if tail is None:
         file_result.batch_count += 1
-        file_result.stats.non_object += batch_result.stats.non_object
-        file_result.stats.json_errors += batch_result.stats.json_errors
-        file_result.stats.incomplete_lines += batch_result.stats.incomplete_lines
-        file_result.stats.empty_lines += batch_result.stats.empty_lines
-        file_result.stats.validation_errors += batch_result.stats.validation_errors
-        if (
-            not batch_result.progressed
-            or batch_result.inserted_count < batch_size
-            or remaining <= 0
-        ):
-            return file_result
+        return file_result
+
+    failed = False
+    try:
+        remaining = max_batches_per_file
+        while True:
+            remaining -= 1
+            if sizer is not None:
+                batch_size = sizer.size_for(tail.path_key)
+            started = monotonic()
+            try:
+                batch_result = ingest_one_batch(group, tail, batch_size)
+            except Exception as e:
+                print(e)
+                failed = True
+                group.rollback()
+                file_result.batch_count += 1
+                return file_result
+            if sizer is not None:
+                sizer.record(
+                    tail.path_key,
+                    batch_size,
+                    batch_result.line_count,
+                    monotonic() - started,
+                )
+
+            # Counted once committed; a rollback discards the callback.
+            group.after_commit(
+                partial(count_inserted, file_result, batch_result.inserted_count)
+            )
+            file_result.batch_count += 1
+            file_result.stats.non_object += batch_result.stats.non_object
+            file_result.stats.json_errors += batch_result.stats.json_errors
+            file_result.stats.incomplete_lines += batch_result.stats.incomplete_lines
+            file_result.stats.empty_lines += batch_result.stats.empty_lines
+            file_result.stats.validation_errors += batch_result.stats.validation_errors
+            file_result.new_offset = tail.saved_offset
+            file_result.inode = tail.saved_inode
+            if tail.rotated and tail.reader.eof:
+                # The rotated file is drained; continue with its replacement.
+                successor = tail.successor()
+                tail.close()
+                if successor is None:
+                    file_result.caught_up = True
+                    return file_result
+                tail = successor
+            elif not tail.rotated and (
+                not batch_result.progressed or batch_result.line_count < batch_size
+            ):
+                file_result.caught_up = True
+                return file_result
+            if remaining <= 0:
+                return file_result
+    finally:
+        if failed or tails is None:
+            tail.close()
+        else:
+            tails.release(tail)
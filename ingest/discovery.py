@@ -1,4 +1,63 @@
+from __future__ import annotations
+
+import os
+import threading
 from pathlib import Path
+from time import monotonic
+from typing import NamedTuple
+
+from config import settings
+
+from .archive import is_archive_path
+
+
+class FileStat(NamedTuple):
+    inode: int
+    size: int
+    mtime_ns: int
+
+
+class IndexedFile:
+    __slots__: tuple[str, ...] = ("path", "stat", "settled_stat")
+
+    def __init__(self, path: Path, stat: FileStat) -> None:
+        self.path: Path = path
+        self.stat: FileStat = stat
+        self.settled_stat: FileStat | None = None
+
+    @property
+    def changed(self) -> bool:
+        return self.stat != self.settled_stat
+
+
+def is_jsonl_path(path: str | Path) -> bool:
+    name = str(path)
+    if name.endswith(".jsonl"):
+        return True
+    return settings.SIEM_INGEST_ARCHIVES_ENABLED and is_archive_path(name)
+
+
+def _stat_of(st: os.stat_result) -> FileStat:
+    return FileStat(st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _walk_jsonl_files(base: Path) -> dict[str, FileStat]:
+    found: dict[str, FileStat] = {}
+    stack = [str(base)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif is_jsonl_path(entry.name) and entry.is_file():
+                        key = entry.path
+                        if entry.is_symlink():
+                            key = os.path.realpath(key)
+                        found[key] = _stat_of(entry.stat())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return found
 
 
 def discover_jsonl_files(log_dir: str | Path) -> list[Path]:
@@ -7,6 +66,109 @@ def discover_jsonl_files(log_dir: str | Path) -> list[Path]:
     if not base.exists():
         return []
 
-    files = [p for p in base.rglob("*.jsonl") if p.is_file()]
+    files = [p for p in base.rglob("*.jsonl*") if is_jsonl_path(p) and p.is_file()]
     files.sort(key=lambda p: str(p))
     return files
+
+
+class DiscoveryIndex:
+    """
+    In-memory view of the *.jsonl files under log_dir, keyed by resolved path.
+
+    Besides the last observed (inode, size, mtime) it remembers the stat at
+    which each file was last fully caught up, so files that did not change
+    since can be skipped without opening them or touching SQLite. The
+    ingest thread refreshes it; request handlers read the last snapshot.
+    """
+
+    def __init__(self, log_dir: str | Path) -> None:
+        self.log_dir: Path = Path(log_dir)
+        self.log_dir_exists: bool = False
+        # None when log_dir cannot be listed.
+        self.apps: list[str] | None = None
+        self.last_scan_at: float | None = None
+        self._files: dict[str, IndexedFile] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def refresh(self) -> list[Path]:
+        base = self.log_dir.resolve()
+        exists = base.is_dir()
+        found = _walk_jsonl_files(base) if exists else {}
+        apps = _list_app_dirs(base) if exists else None
+
+        with self._lock:
+            files: dict[str, IndexedFile] = {}
+            for key, stat in found.items():
+                entry = self._files.get(key)
+                if entry is None:
+                    entry = IndexedFile(Path(key), stat)
+                else:
+                    entry.stat = stat
+                files[key] = entry
+            self._files = files
+            self.log_dir_exists = exists
+            self.apps = apps
+            self.last_scan_at = monotonic()
+            return [e.path for k, e in sorted(files.items()) if e.changed]
+
+    def refresh_paths(self, paths: list[Path]) -> list[Path]:
+        changed: list[Path] = []
+        for path in paths:
+            key = str(path.resolve())
+            try:
+                stat = _stat_of(os.stat(key))
+            except OSError:
+                with self._lock:
+                    _ = self._files.pop(key, None)
+                continue
+
+            with self._lock:
+                entry = self._files.get(key)
+                if entry is None:
+                    entry = IndexedFile(Path(key), stat)
+                    self._files[key] = entry
+                else:
+                    entry.stat = stat
+                if entry.changed:
+                    changed.append(entry.path)
+        return sorted(changed, key=str)
+
+    def mark_settled(self, path_key: str, stat: FileStat) -> None:
+        with self._lock:
+            entry = self._files.get(path_key)
+            if entry is not None:
+                entry.settled_stat = stat
+
+    def stat_of(self, path_key: str) -> FileStat | None:
+        with self._lock:
+            entry = self._files.get(path_key)
+            return None if entry is None else entry.stat
+
+    def ensure_fresh(self, max_age_seconds: float) -> None:
+        last = self.last_scan_at
+        if last is None or monotonic() - last >= max_age_seconds:
+            _ = self.refresh()
+
+    def file_count(self) -> int:
+        with self._lock:
+            return len(self._files)
+
+    def file_paths(self, limit: int | None = None) -> list[str]:
+        with self._lock:
+            keys = sorted(self._files)
+        return keys if limit is None else keys[:limit]
+
+
+def _list_app_dirs(base: Path) -> list[str] | None:
+    apps: list[str] = []
+    try:
+        with os.scandir(base) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    apps.append(entry.name)
+    except (FileNotFoundError, PermissionError):
+        return None
+    apps.sort(key=str.casefold)
+    return apps
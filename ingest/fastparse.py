@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from datetime import datetime, timezone
+from types import ModuleType
+
+from pydantic import AliasChoices
+
+from schemas.incoming import IncomingFields, IncomingLogEvent
+
+orjson: ModuleType | None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class _Fallback(Exception):
+    pass
+
+
+# orjson turns integers beyond 64 bits into floats; lines with a run of 19+
+# digits are left to json.
+_DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+_LONG_DIGIT_RUN = b"0" * 19
+
+_RFC3339_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?(?:Z|[+-]\d{2}:\d{2})?"
+)
+
+_TEXT, _TS, _INT, _FLOAT, _ANY = range(5)
+_KINDS: dict[str, int] = {
+    "ts": _TS,
+    "http_status": _INT,
+    "latency_ms": _FLOAT,
+    "data": _ANY,
+}
+
+
+def _field_keys(name: str) -> tuple[str, ...]:
+    alias = IncomingLogEvent.model_fields[name].validation_alias
+    if isinstance(alias, AliasChoices):
+        keys = tuple(c for c in alias.choices if isinstance(c, str))
+    elif isinstance(alias, str):
+        keys = (alias,)
+    else:
+        keys = ()
+    if name not in keys:
+        keys += (name,)
+    return keys
+
+
+# (kind, accepted keys in lookup order) for each IncomingFields slot.
+_PLAN: tuple[tuple[int, tuple[str, ...]], ...] = tuple(
+    (_KINDS.get(name, _TEXT), _field_keys(name)) for name in IncomingFields._fields
+)
+_soft_int = IncomingLogEvent._soft_int
+_soft_float = IncomingLogEvent._soft_float
+
+
+def loads_line(line: bytes) -> object:
+    if orjson is not None and _LONG_DIGIT_RUN not in line.translate(_DIGITS_TO_ZERO):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line)
+
+
+def parse_rfc3339(value: str) -> datetime | None:
+    if _RFC3339_RE.fullmatch(value) is None:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is None:
+            return dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc)
+    except (ValueError, OverflowError):
+        return None
+
+
+def _convert(kind: int, value: object) -> object:
+    if value is None:
+        return None
+    if kind == _TEXT:
+        if isinstance(value, str):
+            if not value.isascii():
+                _ = value.encode("utf-8")
+            return value.strip() or None
+        if isinstance(value, (int, float, bool)):
+            return str(value).strip() or None
+        return None
+    if kind == _TS:
+        dt = parse_rfc3339(value) if type(value) is str else None
+        if dt is None:
+            raise _Fallback()
+        return dt
+    if kind == _ANY:
+        return value
+    if isinstance(value, float) and not math.isfinite(value):
+        raise _Fallback()
+    return _soft_int(value) if kind == _INT else _soft_float(value)
+
+
+def fast_incoming(parsed: dict[str, object]) -> IncomingFields | None:
+    """
+    Same result as IncomingLogEvent.model_validate for the common shape of a
+    log line, without going through pydantic. Returns None when the input
+    needs the full model (unusual timestamps, invalid strings, ...).
+    """
+    values: list[object] = []
+    try:
+        for kind, keys in _PLAN:
+            value = None
+            for key in keys:
+                if key in parsed:
+                    value = parsed[key]
+                    break
+            values.append(_convert(kind, value))
+    except (_Fallback, UnicodeEncodeError):
+        return None
+    return IncomingFields._make(values)
@@ -1,28 +1,119 @@
 from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
 from threading import Event
 import threading
 from time import monotonic
+from typing import Callable
+from watchfiles import Change, watch
 from config import settings
-from db import SessionLocal
-from ingest.batch import ingest_file_caught_up
+from db import SessionLocal, db_engine, wal_checkpoint
+from ingest.batch import BatchSizer, CommitGroup, ingest_file_caught_up
 from jobs.retention import run_retention_once
-from .discovery import discover_jsonl_files
-from schemas.ingest import IngestResult, IngestState, IngestMetrics
+from repositories.events import insert_event_rows
+from .pipeline import ParsePipeline
+from .push import PushQueue
+from .tail import TailCache
+from .discovery import DiscoveryIndex, FileStat, discover_jsonl_files, is_jsonl_path
+from schemas.ingest import FileResult, IngestResult, IngestState, IngestMetrics
 
 
 def ingest_once(
-    log_dir: str, batch_size: int, max_batches_per_file: int
+    log_dir: str,
+    batch_size: int,
+    max_batches_per_file: int,
+    group_commit_max_events: int = 0,
+    group_commit_max_latency_seconds: float = 0,
+    paths: list[Path] | None = None,
+    index: DiscoveryIndex | None = None,
+    pipeline: ParsePipeline | None = None,
+    sizer: BatchSizer | None = None,
+    tails: TailCache | None = None,
 ) -> IngestResult:
-    paths = discover_jsonl_files(log_dir)
     ingest_result = IngestResult()
+    if index is not None:
+        candidates = index.refresh() if paths is None else index.refresh_paths(paths)
+        scanned = index.file_count() if paths is None else len(paths)
+        ingest_result.files_skipped = scanned - len(candidates)
+        paths = candidates
+    elif paths is None:
+        paths = discover_jsonl_files(log_dir)
+    if tails is not None:
+        # Files rotated away still have unread lines in their old inode.
+        known = set(paths)
+        stale = [p for p in tails.stale_paths() if p not in known]
+        paths = sorted([*paths, *stale], key=str)
+    if not paths:
+        return ingest_result
+    # Taken before any file is read: a later stat may include lines appended
+    # after the read, which would then be skipped as settled.
+    stats = {} if index is None else {str(p): index.stat_of(str(p)) for p in paths}
+
+    with SessionLocal() as session:
+        group = CommitGroup(
+            session, group_commit_max_events, group_commit_max_latency_seconds
+        )
+        on_file_done = (
+            None if index is None else partial(_update_index, index, group, stats)
+        )
+        if tails is not None:
+            group.on_rollback(tails.clear)
+        try:
+            if pipeline is None:
+                _ingest_paths(
+                    paths,
+                    batch_size,
+                    max_batches_per_file,
+                    group,
+                    ingest_result,
+                    on_file_done,
+                    sizer,
+                    tails,
+                )
+            else:
+                pipeline.ingest_paths(
+                    paths,
+                    batch_size,
+                    max_batches_per_file,
+                    group,
+                    ingest_result,
+                    on_file_done,
+                    sizer,
+                    tails,
+                )
+            group.commit()
+        except Exception:
+            group.rollback()
+            raise
+        finally:
+            ingest_result.total_commits = group.commit_count
+
+    # Per-file counts only grow on commit, so rolled back inserts are left out.
+    ingest_result.total_inserted = sum(
+        r.inserted_count for r in ingest_result.per_file.values()
+    )
+    return ingest_result
+
+
+def _ingest_paths(
+    paths: list[Path],
+    batch_size: int,
+    max_batches_per_file: int,
+    group: CommitGroup,
+    ingest_result: IngestResult,
+    on_file_done: Callable[[str, FileResult], None] | None,
+    sizer: BatchSizer | None,
+    tails: TailCache | None,
+) -> None:
     for path in paths:
         try:
             file_path = str(path.resolve())
             file_result = ingest_file_caught_up(
-                file_path, batch_size, max_batches_per_file
+                file_path, batch_size, max_batches_per_file, group, sizer, tails
             )
+            if on_file_done is not None:
+                on_file_done(file_path, file_result)
             ingest_result.files_scanned += 1
-            ingest_result.total_inserted += file_result.inserted_count
             ingest_result.total_batches += file_result.batch_count
             ingest_result.stats.non_object += file_result.stats.non_object
             ingest_result.stats.json_errors += file_result.stats.json_errors
@@ -34,61 +125,339 @@ def ingest_once(
             ingest_result.files_failed += 1
             print(e)
 
-    return ingest_result
+
+def _update_index(
+    index: DiscoveryIndex,
+    group: CommitGroup,
+    stats: dict[str, FileStat | None],
+    path_key: str,
+    file_result: FileResult,
+) -> None:
+    group.after_commit(
+        partial(_apply_index_update, index, path_key, stats.get(path_key), file_result)
+    )
 
 
-def ingest_loop(
-    stop_event: Event, ingest_lock: threading.Lock, ingest_state: IngestState
+def _apply_index_update(
+    index: DiscoveryIndex,
+    path_key: str,
+    stat: FileStat | None,
+    file_result: FileResult,
 ) -> None:
-    next_retention_due = monotonic() + settings.SIEM_RENENTION_RUN_EVERY_SECONDS
-    while not stop_event.is_set():
+    if file_result.caught_up and stat is not None:
+        index.mark_settled(path_key, stat)
+
+
+def _group_commit_limits() -> tuple[int, float]:
+    if not settings.SIEM_INGEST_GROUP_COMMIT_ENABLED:
+        return 0, 0
+    return (
+        settings.SIEM_INGEST_GROUP_COMMIT_MAX_EVENTS,
+        settings.SIEM_INGEST_GROUP_COMMIT_MAX_LATENCY_MS / 1000,
+    )
+
+
+def _run_ingest_cycle(
+    paths: list[Path] | None,
+    ingest_lock: threading.Lock,
+    ingest_state: IngestState,
+    index: DiscoveryIndex,
+    pipeline: ParsePipeline | None,
+    sizer: BatchSizer | None,
+    tails: TailCache | None,
+) -> None:
+    try:
+        ingest_result = ingest_once(
+            settings.SIEM_LOG_DIR,
+            settings.SIEM_INGEST_BATCH_SIZE,
+            settings.SIEM_INGEST_MAX_BATCHES_PER_FILE,
+            *_group_commit_limits(),
+            paths=paths,
+            index=index,
+            pipeline=pipeline,
+            sizer=sizer,
+            tails=tails,
+        )
+        batch_sizes: dict[str, int] = {}
+        if sizer is not None:
+            if paths is None:
+                sizer.retain(index.file_paths())
+            batch_sizes = sizer.snapshot()
+
+        last = IngestMetrics.from_ingest_result(ingest_result)
+        now = datetime.now(timezone.utc)
+
+        with ingest_lock:
+            ingest_state.last_ingest_ok_at = now
+            ingest_state.last_ingest_error = None
+
+            ingest_state.metrics_last = last
+            ingest_state.batch_sizes = batch_sizes
+
+            total = ingest_state.metrics_total
+            total.files_scanned += last.files_scanned
+            total.files_skipped += last.files_skipped
+            total.files_failed += last.files_failed
+            total.total_inserted += last.total_inserted
+            total.total_batches += last.total_batches
+            total.total_commits += last.total_commits
+
+            total.stats.empty_lines += last.stats.empty_lines
+            total.stats.json_errors += last.stats.json_errors
+            total.stats.non_object += last.stats.non_object
+            total.stats.incomplete_lines += last.stats.incomplete_lines
+            total.stats.validation_errors += last.stats.validation_errors
+
+    except Exception as e:
+        with ingest_lock:
+            ingest_state.last_ingest_error = str(e)
+
+    _record_checkpoint(ingest_lock, ingest_state)
+
+
+def _record_checkpoint(ingest_lock: threading.Lock, ingest_state: IngestState) -> None:
+    # Auto-checkpoints give up while readers hold old snapshots; a passive
+    # checkpoint per cycle retries them and shows how far the WAL is behind.
+    try:
+        with db_engine.connect() as conn:
+            frames = wal_checkpoint(conn)
+    except Exception:
+        return
+    if frames is None:
+        return
+    with ingest_lock:
+        storage = ingest_state.storage
+        storage.wal_frames, storage.wal_checkpointed_frames = frames
+        storage.checkpoint_lag_frames = frames[0] - frames[1]
+        storage.last_checkpoint_at = datetime.now(timezone.utc)
+
+
+def _run_retention_if_due(
+    next_retention_due: float, ingest_lock: threading.Lock, ingest_state: IngestState
+) -> float:
+    if not settings.SIEM_RENENTION_ENABLED or monotonic() < next_retention_due:
+        return next_retention_due
+
+    finished = True
+    with SessionLocal() as session:
         try:
-            ingest_result = ingest_once(
-                settings.SIEM_LOG_DIR,
-                settings.SIEM_INGEST_BATCH_SIZE,
-                settings.SIEM_INGEST_MAX_BATCHES_PER_FILE,
+            # A bounded number of chunks per cycle, so a large backlog of
+            # expired events is spread over cycles instead of pausing ingest.
+            result = run_retention_once(
+                session,
+                settings.SIEM_RENENTION_DAYS,
+                settings.SIEM_RETENTION_APP_DAYS,
+                settings.SIEM_RETENTION_CHUNK_ROWS,
+                settings.SIEM_RETENTION_CHUNKS_PER_CYCLE,
+                settings.SIEM_RETENTION_CHUNK_PAUSE_MS / 1000,
+                settings.SIEM_RETENTION_VACUUM_PAGES,
             )
+            finished = result.finished
+            with ingest_lock:
+                ingest_state.last_retention_run_at = datetime.now(timezone.utc)
+                ingest_state.last_retention_error = None
+                ingest_state.last_retention_deleted = result.deleted
+        except Exception as e:
+            with ingest_lock:
+                ingest_state.last_retention_run_at = datetime.now(timezone.utc)
+                ingest_state.last_retention_error = str(e)
 
-            last = IngestMetrics.from_ingest_result(ingest_result)
-            now = datetime.now(timezone.utc)
+    if not finished:
+        return monotonic()
+    return monotonic() + settings.SIEM_RENENTION_RUN_EVERY_SECONDS
 
-            with ingest_lock:
-                ingest_state.last_ingest_ok_at = now
-                ingest_state.last_ingest_error = None
 
-                ingest_state.metrics_last = last
+def _write_pushed(
+    push: PushQueue, ingest_lock: threading.Lock, ingest_state: IngestState
+) -> bool:
+    # Everything queued since the last call goes into one transaction.
+    events = push.take_all()
+    if not events:
+        return True
+    try:
+        with SessionLocal() as session:
+            written = insert_event_rows(session, events)
+            session.commit()
+        push.record_written(written, 0)
+        return True
+    except Exception as e:
+        # The events were acknowledged to their sender; keep them for the
+        # next attempt instead of dropping them.
+        push.requeue(events)
+        push.record_written(0, len(events))
+        with ingest_lock:
+            ingest_state.last_ingest_error = str(e)
+        return False
+
+
+def _wait_writing_pushed(
+    stop_event: Event,
+    push: PushQueue | None,
+    timeout: float,
+    ingest_lock: threading.Lock,
+    ingest_state: IngestState,
+) -> None:
+    """Sleeps until timeout or stop, writing pushed events as they arrive."""
+    if push is None:
+        _ = stop_event.wait(timeout=timeout)
+        return
+    deadline = monotonic() + timeout
+    while not stop_event.is_set() and not push.closed:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return
+        if push.wait(remaining) and not _write_pushed(push, ingest_lock, ingest_state):
+            # Retry the requeued events next cycle, not in a busy loop.
+            _ = stop_event.wait(timeout=remaining)
+            return
+
+
+def _poll_loop(
+    stop_event: Event,
+    ingest_lock: threading.Lock,
+    ingest_state: IngestState,
+    index: DiscoveryIndex,
+    pipeline: ParsePipeline | None,
+    sizer: BatchSizer | None,
+    tails: TailCache | None,
+    push: PushQueue | None,
+) -> None:
+    next_retention_due = monotonic() + settings.SIEM_RENENTION_RUN_EVERY_SECONDS
+    while not stop_event.is_set():
+        _run_ingest_cycle(
+            None, ingest_lock, ingest_state, index, pipeline, sizer, tails
+        )
+        next_retention_due = _run_retention_if_due(
+            next_retention_due, ingest_lock, ingest_state
+        )
+        _wait_writing_pushed(
+            stop_event,
+            push,
+            settings.SIEM_INGEST_POLL_SECONDS,
+            ingest_lock,
+            ingest_state,
+        )
 
-                total = ingest_state.metrics_total
-                total.files_scanned += last.files_scanned
-                total.files_failed += last.files_failed
-                total.total_inserted += last.total_inserted
-                total.total_batches += last.total_batches
 
-                total.stats.empty_lines += last.stats.empty_lines
-                total.stats.json_errors += last.stats.json_errors
-                total.stats.non_object += last.stats.non_object
-                total.stats.incomplete_lines += last.stats.incomplete_lines
-                total.stats.validation_errors += last.stats.validation_errors
+def _watch_filter(change: Change, path: str) -> bool:
+    return change != Change.deleted and is_jsonl_path(path)
 
+
+def _watch_loop(
+    stop_event: Event,
+    ingest_lock: threading.Lock,
+    ingest_state: IngestState,
+    index: DiscoveryIndex,
+    pipeline: ParsePipeline | None,
+    sizer: BatchSizer | None,
+    tails: TailCache | None,
+    push: PushQueue | None,
+) -> None:
+    log_dir = Path(settings.SIEM_LOG_DIR)
+    timeout_ms = settings.SIEM_INGEST_POLL_SECONDS * 1000
+    if push is not None:
+        # Wake up often enough that pushed events are not held back by a
+        # quiet log directory.
+        timeout_ms = min(timeout_ms, settings.SIEM_INGEST_PUSH_MAX_LATENCY_MS)
+    next_retention_due = monotonic() + settings.SIEM_RENENTION_RUN_EVERY_SECONDS
+    while not stop_event.is_set():
+        _run_ingest_cycle(
+            None, ingest_lock, ingest_state, index, pipeline, sizer, tails
+        )
+        next_rescan_due = monotonic() + settings.SIEM_INGEST_RESCAN_SECONDS
+        next_retention_due = _run_retention_if_due(
+            next_retention_due, ingest_lock, ingest_state
+        )
+        if not log_dir.is_dir():
+            _wait_writing_pushed(
+                stop_event,
+                push,
+                settings.SIEM_INGEST_POLL_SECONDS,
+                ingest_lock,
+                ingest_state,
+            )
+            continue
+
+        try:
+            for changes in watch(
+                log_dir,
+                watch_filter=_watch_filter,
+                debounce=settings.SIEM_INGEST_WATCH_DEBOUNCE_MS,
+                stop_event=stop_event,
+                rust_timeout=timeout_ms,
+                yield_on_timeout=True,
+            ):
+                if push is not None:
+                    _ = _write_pushed(push, ingest_lock, ingest_state)
+                if monotonic() >= next_rescan_due:
+                    break
+                paths = sorted({Path(p) for _, p in changes}, key=str)
+                _run_ingest_cycle(
+                    paths, ingest_lock, ingest_state, index, pipeline, sizer, tails
+                )
+                next_retention_due = _run_retention_if_due(
+                    next_retention_due, ingest_lock, ingest_state
+                )
         except Exception as e:
             with ingest_lock:
                 ingest_state.last_ingest_error = str(e)
-        if settings.SIEM_RENENTION_ENABLED and monotonic() >= next_retention_due:
-            with SessionLocal() as session:
-                try:
-                    deleted = run_retention_once(session, settings.SIEM_RENENTION_DAYS)
-                    with ingest_lock:
-                        ingest_state.last_retention_run_at = datetime.now(timezone.utc)
-                        ingest_state.last_retention_error = None
-                        ingest_state.last_retention_deleted = deleted
-                except Exception as e:
-                    with ingest_lock:
-                        ingest_state.last_retention_run_at = datetime.now(timezone.utc)
-                        ingest_state.last_retention_error = str(e)
-                finally:
-                    next_retention_due = (
-                        monotonic() + settings.SIEM_RENENTION_RUN_EVERY_SECONDS
-                    )
-
-        # print(ingest_result)
-        _ = stop_event.wait(timeout=settings.SIEM_INGEST_POLL_SECONDS)
+            _ = stop_event.wait(timeout=settings.SIEM_INGEST_POLL_SECONDS)
+
+
+def ingest_loop(
+    stop_event: Event,
+    ingest_lock: threading.Lock,
+    ingest_state: IngestState,
+    index: DiscoveryIndex,
+    push: PushQueue | None = None,
+) -> None:
+    pipeline = None
+    if settings.SIEM_INGEST_PARSE_WORKERS > 0:
+        pipeline = ParsePipeline(
+            settings.SIEM_INGEST_PARSE_WORKERS,
+            settings.SIEM_INGEST_READER_THREADS,
+            settings.SIEM_INGEST_PIPELINE_QUEUE_SIZE,
+            settings.SIEM_INGEST_FAST_PARSE,
+        )
+    sizer = None
+    if settings.SIEM_INGEST_ADAPTIVE_BATCH_ENABLED:
+        sizer = BatchSizer(
+            settings.SIEM_INGEST_BATCH_SIZE,
+            settings.SIEM_INGEST_ADAPTIVE_MIN_BATCH_SIZE,
+            settings.SIEM_INGEST_ADAPTIVE_MAX_BATCH_SIZE,
+            settings.SIEM_INGEST_ADAPTIVE_TARGET_MS / 1000,
+        )
+    tails = None
+    if settings.SIEM_INGEST_KEEP_FILES_OPEN:
+        tails = TailCache(settings.SIEM_INGEST_MAX_OPEN_FILES)
+    try:
+        if settings.SIEM_INGEST_WATCH_ENABLED:
+            _watch_loop(
+                stop_event,
+                ingest_lock,
+                ingest_state,
+                index,
+                pipeline,
+                sizer,
+                tails,
+                push,
+            )
+        else:
+            _poll_loop(
+                stop_event,
+                ingest_lock,
+                ingest_state,
+                index,
+                pipeline,
+                sizer,
+                tails,
+                push,
+            )
+    finally:
+        if push is not None:
+            push.close()
+            _ = _write_pushed(push, ingest_lock, ingest_state)
+        if pipeline is not None:
+            pipeline.shutdown()
+        if tails is not None:
+            tails.clear()
@@ -1,56 +1,107 @@
 from __future__ import annotations
 
-from datetime import datetime
-from pathlib import Path
+from datetime import datetime, timezone
+from typing import NamedTuple
 
 from config import settings
-from models.models import Event
-from schemas.incoming import IncomingLogEvent
+from repositories.payloads import pack_payload
+from schemas.event import EventRow
+from schemas.incoming import IncomingFields, IncomingLogEvent
 
+from .archive import is_archive_path
 from .utils import (
-    app_from_path,
     cap_text,
     decode_jsonl_line,
     safe_json_dumps,
     utc_now_iso,
+    dt_to_epoch_us,
     dt_to_utc_rfc3339_z,
 )
 
 
-def build_event(
-    incoming: IncomingLogEvent,
-    *,
-    raw_line: bytes,
-    file_path: Path,
-    source_file: str,
-    source_offset: int,
+class NormalizeContext(NamedTuple):
+    app: str | None
+    source_file: str | None
+    source_generation: int
+    received_at: str
+    fallback_ts: str
+    fallback_ts_us: int
+    max_message_len: int
+    max_user_agent_len: int
+    max_http_path_len: int
+    max_data_json_len: int
+    max_raw_json_len: int
+    payload_compression_level: int
+    # raw_json is not stored; /events/{id} reads the line from source_file.
+    raw_json_from_source: bool
+
+
+def build_context(
+    app: str | None,
+    source_file: str | None,
     received_at: str | None = None,
-) -> Event:
+    source_generation: int = 0,
+) -> NormalizeContext:
     received_at_val = received_at or utc_now_iso()
-    ts_dt: datetime | None = incoming.ts
-    if ts_dt is None:
-        try:
-            ts_dt = datetime.fromisoformat(received_at_val.replace("Z", "+00:00"))
-        except ValueError:
-            ts_dt = None
+    try:
+        received_dt = datetime.fromisoformat(received_at_val.replace("Z", "+00:00"))
+        fallback_ts = dt_to_utc_rfc3339_z(received_dt)
+    except ValueError:
+        received_dt = datetime.now(timezone.utc)
+        fallback_ts = received_at_val
 
-    ts_str = dt_to_utc_rfc3339_z(ts_dt) if ts_dt is not None else received_at_val
+    return NormalizeContext(
+        app=app,
+        source_file=source_file,
+        source_generation=source_generation,
+        received_at=received_at_val,
+        fallback_ts=fallback_ts,
+        fallback_ts_us=dt_to_epoch_us(received_dt),
+        max_message_len=settings.SIEM_MAX_MESSAGE_LEN,
+        max_user_agent_len=settings.SIEM_MAX_USER_AGENT_LEN,
+        max_http_path_len=settings.SIEM_MAX_HTTP_PATH_LEN,
+        max_data_json_len=settings.SIEM_MAX_DATA_JSON_LEN,
+        max_raw_json_len=settings.SIEM_MAX_RAW_JSON_LEN,
+        payload_compression_level=settings.SIEM_PAYLOAD_COMPRESSION_LEVEL,
+        # Offsets into an archive are into its decompressed text, which
+        # cannot be read back at random.
+        raw_json_from_source=settings.SIEM_RAW_JSON_FROM_SOURCE
+        and source_file is not None
+        and not is_archive_path(source_file),
+    )
 
-    app = incoming.app or app_from_path(file_path)
+
+def build_event(
+    incoming: IncomingLogEvent | IncomingFields,
+    *,
+    raw_line: bytes,
+    source_offset: int | None,
+    ctx: NormalizeContext,
+) -> EventRow:
+    ts_dt: datetime | None = incoming.ts
+    if ts_dt is not None:
+        ts_str = dt_to_utc_rfc3339_z(ts_dt)
+        ts_us = dt_to_epoch_us(ts_dt)
+    else:
+        ts_str = ctx.fallback_ts
+        ts_us = ctx.fallback_ts_us
 
     data_json = safe_json_dumps(incoming.data)
-    raw_json = decode_jsonl_line(raw_line)
+    raw_json = None
+    if not ctx.raw_json_from_source or source_offset is None:
+        raw_json = decode_jsonl_line(raw_line)
 
-    return Event(
+    return EventRow(
         ts=ts_str,
-        received_at=received_at_val,
-        app=app,
+        ts_us=ts_us,
+        received_at=ctx.received_at,
+        app=incoming.app or ctx.app,
         host=incoming.host,
         level=incoming.level,
         event_type=incoming.event_type,
         message=cap_text(
             incoming.message,
-            settings.SIEM_MAX_MESSAGE_LEN,
+            ctx.max_message_len,
             strip=True,
             empty_to_none=True,
         ),
@@ -59,32 +110,40 @@ def build_event(
         src_ip=incoming.src_ip,
         user_agent=cap_text(
             incoming.user_agent,
-            settings.SIEM_MAX_USER_AGENT_LEN,
+            ctx.max_user_agent_len,
             strip=True,
             empty_to_none=True,
         ),
         http_method=incoming.http_method,
         http_path=cap_text(
             incoming.http_path,
-            settings.SIEM_MAX_HTTP_PATH_LEN,
+            ctx.max_http_path_len,
             strip=True,
             empty_to_none=True,
         ),
         http_status=incoming.http_status,
         latency_ms=incoming.latency_ms,
         error_type=incoming.error_type,
-        data_json=cap_text(
-            data_json,
-            settings.SIEM_MAX_DATA_JSON_LEN,
-            strip=False,
-            empty_to_none=True,
+        # Compressed here, in the parse workers, rather than by the writer.
+        data_json=pack_payload(
+            cap_text(
+                data_json,
+                ctx.max_data_json_len,
+                strip=False,
+                empty_to_none=True,
+            ),
+            ctx.payload_compression_level,
         ),
-        raw_json=cap_text(
-            raw_json,
-            settings.SIEM_MAX_RAW_JSON_LEN,
-            strip=False,
-            empty_to_none=False,
+        raw_json=pack_payload(
+            cap_text(
+                raw_json,
+                ctx.max_raw_json_len,
+                strip=False,
+                empty_to_none=False,
+            ),
+            ctx.payload_compression_level,
         ),
-        source_file=source_file,
+        source_file=ctx.source_file,
         source_offset=source_offset,
+        source_generation=ctx.source_generation,
     )
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from queue import Full, Queue
+from time import monotonic
+from typing import Callable, Iterator, NamedTuple
+
+from schemas.event import EventRow
+from schemas.ingest import FileResult, IngestResult, Stats
+
+from .batch import BatchSizer, CommitGroup, count_inserted, open_tail, write_batch
+from .normalize import NormalizeContext, build_context
+from .tail import FileTail, TailCache, parse_line
+
+
+class PipelineItem(NamedTuple):
+    tail: FileTail
+    parsed: Future[tuple[list[EventRow], Stats, float]] | None
+    end_offset: int
+    batch_size: int = 0
+    line_count: int = 0
+    complete: bool = False
+    incomplete_lines: int = 0
+    done: bool = False
+    caught_up: bool = False
+    error: str | None = None
+
+
+def parse_lines(
+    lines: list[tuple[int, bytes]], ctx: NormalizeContext, fast_parse: bool
+) -> tuple[list[EventRow], Stats, float]:
+    started = monotonic()
+    stats = Stats()
+    events: list[EventRow] = []
+    for source_offset, line in lines:
+        row = parse_line(line, source_offset, ctx, stats, fast_parse)
+        if row is not None:
+            events.append(row)
+    return events, stats, monotonic() - started
+
+
+class ParsePipeline:
+    """
+    Staged ingest: reader threads pull raw lines per file, a process pool
+    parses and normalises them, and the caller's thread stays the only
+    writer. Per-file order is kept because every reader enqueues its own
+    batches in file order into one FIFO queue; the queue bound provides
+    back-pressure on the readers.
+    """
+
+    def __init__(
+        self,
+        parse_workers: int,
+        reader_threads: int,
+        queue_size: int,
+        fast_parse: bool = True,
+    ) -> None:
+        self.reader_threads: int = max(reader_threads, 1)
+        self.parse_pool: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=parse_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        self.reader_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=self.reader_threads,
+            thread_name_prefix="mini-siem-reader",
+        )
+        self.queue_size: int = max(queue_size, 1)
+        self.fast_parse: bool = fast_parse
+
+    def shutdown(self) -> None:
+        self.reader_pool.shutdown(wait=True, cancel_futures=True)
+        self.parse_pool.shutdown(wait=True, cancel_futures=True)
+
+    def ingest_paths(
+        self,
+        paths: list[Path],
+        batch_size: int,
+        max_batches_per_file: int,
+        group: CommitGroup,
+        ingest_result: IngestResult,
+        on_file_done: Callable[[str, FileResult], None] | None = None,
+        sizer: BatchSizer | None = None,
+        tails: TailCache | None = None,
+    ) -> None:
+        queue: Queue[PipelineItem] = Queue(maxsize=self.queue_size)
+        abort = threading.Event()
+        results: dict[str, FileResult] = {}
+        # Files are opened as earlier ones are done, so no more of them are
+        # open than there are readers. Opening stays on this thread, which
+        # owns the session the saved offsets are looked up with.
+        start_next = partial(
+            self._start_next,
+            iter(paths),
+            queue,
+            abort,
+            group,
+            ingest_result,
+            results,
+            batch_size,
+            max_batches_per_file,
+            sizer,
+            tails,
+        )
+        started = 0
+        while started < self.reader_threads and start_next():
+            started += 1
+
+        try:
+            failed = self._write_until_done(
+                queue, started, start_next, group, results, on_file_done, sizer, tails
+            )
+        finally:
+            abort.set()
+
+        for path_key, file_result in results.items():
+            if path_key in failed:
+                ingest_result.files_failed += 1
+                continue
+            ingest_result.files_scanned += 1
+            ingest_result.total_batches += file_result.batch_count
+            ingest_result.stats.non_object += file_result.stats.non_object
+            ingest_result.stats.json_errors += file_result.stats.json_errors
+            ingest_result.stats.incomplete_lines += file_result.stats.incomplete_lines
+            ingest_result.stats.empty_lines += file_result.stats.empty_lines
+            ingest_result.stats.validation_errors += file_result.stats.validation_errors
+            ingest_result.per_file[path_key] = file_result
+
+    def _start_next(
+        self,
+        paths: Iterator[Path],
+        queue: Queue[PipelineItem],
+        abort: threading.Event,
+        group: CommitGroup,
+        ingest_result: IngestResult,
+        results: dict[str, FileResult],
+        batch_size: int,
+        max_batches_per_file: int,
+        sizer: BatchSizer | None,
+        tails: TailCache | None,
+    ) -> bool:
+        """Opens the next of paths and hands it to a reader; False once none is left."""
+        for path in paths:
+            try:
+                tail = open_tail(group.session, str(path), tails)
+            except Exception as e:
+                ingest_result.files_failed += 1
+                print(e)
+                continue
+            file_result = FileResult(inserted_count=0, batch_count=0, stats=Stats())
+            if tail is None:
+                file_result.batch_count += 1
+                ingest_result.per_file[str(path.resolve())] = file_result
+                continue
+            results[tail.path_key] = file_result
+            _ = self.reader_pool.submit(
+                self._read_file,
+                tail,
+                queue,
+                abort,
+                batch_size,
+                max_batches_per_file,
+                sizer,
+            )
+            return True
+        return False
+
+    def _write_until_done(
+        self,
+        queue: Queue[PipelineItem],
+        pending_files: int,
+        start_next: Callable[[], bool],
+        group: CommitGroup,
+        results: dict[str, FileResult],
+        on_file_done: Callable[[str, FileResult], None] | None,
+        sizer: BatchSizer | None,
+        tails: TailCache | None,
+    ) -> set[str]:
+        failed: set[str] = set()
+        uncommitted: set[str] = set()
+
+        while pending_files > 0:
+            item = queue.get()
+            path_key = item.tail.path_key
+            file_result = results[path_key]
+
+            if item.done:
+                pending_files -= 1
+                if path_key in failed or tails is None:
+                    item.tail.close()
+                else:
+                    tails.release(item.tail)
+                if path_key not in failed:
+                    file_result.caught_up = item.caught_up
+                    if on_file_done is not None:
+                        on_file_done(path_key, file_result)
+                if start_next():
+                    pending_files += 1
+                continue
+
+            if path_key in failed:
+                continue
+
+            try:
+                if item.error is not None:
+                    raise RuntimeError(item.error)
+                events, stats, parse_seconds = (
+                    ([], Stats(), 0.0) if item.parsed is None else item.parsed.result()
+                )
+                started = monotonic()
+                inserted, progressed = write_batch(
+                    group, item.tail, events, item.end_offset, item.complete
+                )
+                write_seconds = monotonic() - started
+            except Exception as e:
+                print(e)
+                group.rollback()
+                failed.add(path_key)
+                failed.update(uncommitted)
+                uncommitted.clear()
+                file_result.batch_count += 1
+                continue
+
+            if progressed or inserted:
+                uncommitted.add(path_key)
+            if group.pending_writes == 0:
+                uncommitted.clear()
+            if sizer is not None:
+                sizer.record(
+                    path_key,
+                    item.batch_size,
+                    item.line_count,
+                    parse_seconds + write_seconds,
+                )
+
+            group.after_commit(partial(count_inserted, file_result, inserted))
+            file_result.batch_count += 1
+            file_result.stats.non_object += stats.non_object
+            file_result.stats.json_errors += stats.json_errors
+            file_result.stats.incomplete_lines += item.incomplete_lines
+            file_result.stats.empty_lines += stats.empty_lines
+            file_result.stats.validation_errors += stats.validation_errors
+            file_result.new_offset = item.tail.saved_offset
+            file_result.inode = item.tail.saved_inode
+
+        return failed
+
+    def _read_file(
+        self,
+        tail: FileTail,
+        queue: Queue[PipelineItem],
+        abort: threading.Event,
+        batch_size: int,
+        max_batches_per_file: int,
+        sizer: BatchSizer | None,
+    ) -> None:
+        caught_up = False
+        try:
+            for _ in range(max_batches_per_file):
+                reader = tail.reader
+                if sizer is not None:
+                    batch_size = sizer.size_for(tail.path_key)
+                lines: list[tuple[int, bytes]] = []
+                while len(lines) < batch_size:
+                    line_start_offset = reader.offset
+                    line = reader.next_line()
+                    if line is None:
+                        break
+                    lines.append((line_start_offset, line))
+
+                caught_up = len(lines) < batch_size
+                parsed = None
+                if lines:
+                    parsed = self.parse_pool.submit(
+                        parse_lines,
+                        lines,
+                        build_context(
+                            tail.app, tail.path_key, source_generation=tail.generation
+                        ),
+                        self.fast_parse,
+                    )
+                item = PipelineItem(
+                    tail,
+                    parsed,
+                    reader.offset,
+                    batch_size,
+                    len(lines),
+                    tail.complete,
+                    incomplete_lines=int(caught_up and reader.has_partial),
+                )
+                if not _put(queue, item, abort):
+                    break
+                if tail.rotated and reader.eof:
+                    # The rotated file is drained; continue with its replacement.
+                    successor = tail.successor()
+                    tail.close()
+                    if successor is None:
+                        break
+                    tail = successor
+                    caught_up = False
+                elif caught_up and not tail.rotated:
+                    break
+        except Exception as e:
+            caught_up = False
+            _ = _put(queue, PipelineItem(tail, None, tail.offset, error=str(e)), abort)
+        finally:
+            _ = _put(
+                queue,
+                PipelineItem(tail, None, tail.offset, done=True, caught_up=caught_up),
+                abort,
+            )
+
+
+def _put(queue: Queue[PipelineItem], item: PipelineItem, abort: threading.Event) -> bool:
+    while not abort.is_set():
+        try:
+            queue.put(item, timeout=0.5)
+            return True
+        except Full:
+            continue
+    return False
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from collections.abc import Callable
+
+from schemas.event import EventRow
+from schemas.ingest import PushMetrics, Stats
+
+from .normalize import NormalizeContext
+from .tail import parse_line
+
+
+class PushQueue:
+    """
+    Bounded hand-off between the push endpoint and the ingest thread, which
+    stays the only writer. A request's events are queued whole or not at
+    all; max_events bounds how many events wait to be written. Events whose
+    write failed are put back in front and retried.
+    """
+
+    def __init__(self, max_events: int) -> None:
+        self.max_events: int = max(max_events, 1)
+        self.closed: bool = False
+        self._batches: deque[list[EventRow]] = deque()
+        self._pending: int = 0
+        self._cond: threading.Condition = threading.Condition()
+        self._metrics: PushMetrics = PushMetrics()
+        self._on_drained: list[Callable[[], None]] = []
+
+    def has_room(self) -> bool:
+        with self._cond:
+            return self._pending < self.max_events
+
+    def offer(self, events: list[EventRow]) -> bool:
+        with self._cond:
+            if self.closed or self._pending + len(events) > self.max_events:
+                return False
+            if events:
+                self._batches.append(events)
+                self._pending += len(events)
+                self._cond.notify_all()
+            self._metrics.accepted_events += len(events)
+            return True
+
+    def reject(self) -> None:
+        with self._cond:
+            self._metrics.rejected_requests += 1
+
+    def on_drained(self, callback: Callable[[], None]) -> None:
+        """
+        Calls callback, from the thread that drained it, whenever the queue
+        was emptied or closed, so producers waiting for room can retry.
+        """
+        with self._cond:
+            self._on_drained.append(callback)
+
+    def _notify_drained(self) -> None:
+        with self._cond:
+            callbacks = list(self._on_drained)
+        for callback in callbacks:
+            callback()
+
+    def take_all(self) -> list[EventRow]:
+        with self._cond:
+            batches = self._batches
+            self._batches = deque()
+            self._pending = 0
+        if batches:
+            self._notify_drained()
+        events: list[EventRow] = []
+        for batch in batches:
+            events.extend(batch)
+        return events
+
+    def requeue(self, events: list[EventRow]) -> None:
+        """Puts events taken but not written back at the head of the queue."""
+        if not events:
+            return
+        with self._cond:
+            self._batches.appendleft(events)
+            self._pending += len(events)
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until events are queued or the queue is closed."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending > 0 or self.closed, timeout
+            )
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._notify_drained()
+
+    def record_written(self, written: int, failed: int) -> None:
+        with self._cond:
+            self._metrics.written_events += written
+            self._metrics.failed_events += failed
+
+    def snapshot(self) -> PushMetrics:
+        with self._cond:
+            return self._metrics.model_copy(update={"queued_events": self._pending})
+
+
+class NdjsonBatch:
+    """Parses an NDJSON body chunk by chunk; the last line may lack its newline."""
+
+    def __init__(self, ctx: NormalizeContext, fast_parse: bool = True) -> None:
+        self.ctx: NormalizeContext = ctx
+        self.fast_parse: bool = fast_parse
+        self.events: list[EventRow] = []
+        self.stats: Stats = Stats()
+        self._partial: bytes = b""
+
+    @property
+    def partial_bytes(self) -> int:
+        return len(self._partial)
+
+    def take_events(self) -> list[EventRow]:
+        events = self.events
+        self.events = []
+        return events
+
+    def feed(self, chunk: bytes) -> None:
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        self._parse(lines)
+
+    def finish(self) -> None:
+        if self._partial.strip() != b"":
+            self._parse([self._partial])
+        self._partial = b""
+
+    def _parse(self, lines: list[bytes]) -> None:
+        for line in lines:
+            row = parse_line(line, None, self.ctx, self.stats, self.fast_parse)
+            if row is not None:
+                self.events.append(row)
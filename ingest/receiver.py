@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+from .normalize import build_context
+from .push import NdjsonBatch, PushQueue
+
+_READ_BYTES = 65536
+
+
+class SocketReceiver:
+    """
+    NDJSON listener on a Unix domain socket and/or a TCP port. It runs its
+    own asyncio loop in a background thread so parsing never stalls the API,
+    and hands the events of every read to the push queue. While the queue
+    is full a connection stops reading until the queue is drained, so its
+    socket buffers fill up and the producer blocks instead of events being
+    dropped.
+    """
+
+    def __init__(
+        self,
+        queue: PushQueue,
+        socket_path: str | None,
+        tcp_host: str,
+        tcp_port: int | None,
+        max_line_bytes: int,
+        fast_parse: bool = True,
+    ) -> None:
+        self.queue: PushQueue = queue
+        self.socket_path: str | None = socket_path
+        self.tcp_host: str = tcp_host
+        self.tcp_port: int | None = tcp_port
+        self.max_line_bytes: int = max_line_bytes
+        self.fast_parse: bool = fast_parse
+        self.connections: int = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping: asyncio.Event | None = None
+        # Set from the ingest thread each time it drains the queue.
+        self._drained: asyncio.Event | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._thread: threading.Thread | None = None
+        self._ready: threading.Event = threading.Event()
+        self._error: BaseException | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="mini-siem-receiver", daemon=True
+        )
+        self._thread.start()
+        _ = self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def stop(self, timeout: float = 5) -> None:
+        loop, stopping = self._loop, self._stopping
+        if loop is not None and stopping is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(stopping.set)
+            except RuntimeError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _notify_drained(self) -> None:
+        loop, drained = self._loop, self._drained
+        if loop is not None and drained is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(drained.set)
+            except RuntimeError:
+                pass
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._serve())
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._drained = asyncio.Event()
+        self.queue.on_drained(self._notify_drained)
+        servers: list[asyncio.Server] = []
+        try:
+            if self.socket_path:
+                path = Path(self.socket_path)
+                if path.is_socket():
+                    path.unlink()
+                servers.append(
+                    await asyncio.start_unix_server(
+                        self._handle, path=self.socket_path, backlog=1024
+                    )
+                )
+                os.chmod(self.socket_path, 0o660)
+            if self.tcp_port:
+                servers.append(
+                    await asyncio.start_server(
+                        self._handle, self.tcp_host, self.tcp_port, backlog=1024
+                    )
+                )
+            self._ready.set()
+            _ = await self._stopping.wait()
+        finally:
+            for server in servers:
+                server.close()
+            for writer in list(self._writers):
+                writer.close()
+            for server in servers:
+                await server.wait_closed()
+            if self.socket_path and Path(self.socket_path).is_socket():
+                Path(self.socket_path).unlink()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        self.connections += 1
+        batch = NdjsonBatch(build_context(None, None), self.fast_parse)
+        try:
+            while True:
+                chunk = await reader.read(_READ_BYTES)
+                batch.ctx = build_context(None, None)
+                if chunk == b"":
+                    batch.finish()
+                    await self._offer(batch)
+                    return
+                batch.feed(chunk)
+                if batch.partial_bytes > self.max_line_bytes:
+                    # A line this long is not a log event; drop the producer.
+                    return
+                await self._offer(batch)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _offer(self, batch: NdjsonBatch) -> None:
+        events = batch.take_events()
+        # Offered in slices the queue can hold, or a read with more events
+        # than max_events would never fit.
+        size = self.queue.max_events
+        for start in range(0, len(events), size):
+            chunk = events[start : start + size]
+            while not self.queue.offer(chunk):
+                if self.queue.closed or self._drained is None:
+                    return
+                # Cleared before waiting: a drain after the failed offer sets
+                # it again, from a callback that runs on this loop later.
+                self._drained.clear()
+                _ = await self._drained.wait()
@@ -1,104 +1,434 @@
 from __future__ import annotations
 
 import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import cast
+from typing import BinaryIO, cast
 
-from sqlmodel import Session
 from pydantic import ValidationError
 
-from models.models import Event
-from repositories.file_offsets import get_offset
+from config import settings
+
+from schemas.event import EventRow
 from schemas.ingest import Stats, TailResult
-from schemas.incoming import IncomingLogEvent
+from schemas.incoming import IncomingFields, IncomingLogEvent
 
-from .normalize import build_event
-from .utils import compute_start_offset, utc_now_iso
+from .archive import ArchiveStream, is_archive_path
+from .fastparse import fast_incoming, loads_line
+from .normalize import NormalizeContext, build_context, build_event
+from .utils import (
+    FINGERPRINT_BYTES,
+    app_from_path,
+    compute_start_offset,
+    first_line,
+    head_fingerprint,
+)
 
 
-def read_new_lines_since_last_offset(
-    session: Session, path: str | Path, *, max_events: int = 200
-) -> TailResult:
-    fp = Path(path).resolve()
-    path_key = str(fp)
-    stats = Stats()
-    row = get_offset(session, path_key)
-    saved_offset = 0 if row is None or row.offset is None else row.offset
-    saved_inode = None if row is None else row.inode
+class ChunkedLineReader:
+    """
+    Reads a file in large blocks and hands out complete lines (without the
+    trailing newline). offset is always the file offset of the first byte
+    not yet handed out; a trailing partial line stays buffered until its
+    newline arrives.
+    """
 
-    if not fp.exists():
-        return TailResult(events=[], new_offset=saved_offset, inode=None, stats=stats)
+    def __init__(
+        self, f: BinaryIO, offset: int, chunk_size: int, mmap_min_bytes: int = 0
+    ) -> None:
+        self.f: BinaryIO = f
+        self.offset: int = offset
+        self.chunk_size: int = max(chunk_size, 1)
+        self._lines: list[bytes] = []
+        self._pos: int = 0
+        self._partial: bytes = b""
+        self._read_pos: int = offset
+        self.eof: bool = False
+        self._mm: mmap.mmap | None = None
+        if mmap_min_bytes > 0:
+            size = os.fstat(f.fileno()).st_size
+            if size - offset >= mmap_min_bytes:
+                self._mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
 
-    st = fp.stat()
-    inode = st.st_ino
-    size = st.st_size
+    @property
+    def has_partial(self) -> bool:
+        return self._partial != b""
 
-    start_offset = compute_start_offset(saved_offset, saved_inode, inode, size)
+    @property
+    def drained(self) -> bool:
+        return self._pos >= len(self._lines) and self._partial == b""
 
-    events: list[Event] = []
-    new_offset = start_offset
-    current_line_start_offset = start_offset
-    received_at_now = utc_now_iso()
+    @property
+    def position(self) -> int:
+        """File offset up to which bytes have been read, including buffered ones."""
+        return self._read_pos
 
-    with fp.open("rb") as f:
-        _ = f.seek(start_offset)
+    def next_line(self) -> bytes | None:
+        if self._pos >= len(self._lines) and not self._fill():
+            self.eof = True
+            return None
+        self.eof = False
+        line = self._lines[self._pos]
+        self._pos += 1
+        self.offset += len(line) + 1
+        return line
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _read_chunk(self) -> bytes:
+        mm = self._mm
+        if mm is not None:
+            if self._read_pos < len(mm):
+                chunk = mm[self._read_pos : self._read_pos + self.chunk_size]
+                self._read_pos += len(chunk)
+                return chunk
+            self.close()
+            _ = self.f.seek(self._read_pos)
+        chunk = self.f.read(self.chunk_size)
+        self._read_pos += len(chunk)
+        return chunk
 
+    def _fill(self) -> bool:
         while True:
-            if len(events) >= max_events:
-                break
-            line = f.readline()
-            if line == b"":
-                break  # EOF
+            chunk = self._read_chunk()
+            if chunk == b"":
+                return False
+            lines = chunk.split(b"\n")
+            if len(lines) == 1:
+                self._partial += chunk
+                continue
+            lines[0] = self._partial + lines[0]
+            self._partial = lines.pop()
+            self._lines = lines
+            self._pos = 0
+            return True
 
-            line_end_offset = f.tell()
 
-            if not line.endswith(b"\n"):
-                stats.incomplete_lines += 1
-                _ = f.seek(current_line_start_offset)
-                break
+class FileTail:
+    def __init__(
+        self,
+        path_key: str,
+        f: BinaryIO,
+        inode: int,
+        offset: int,
+        saved_offset: int | None,
+        saved_inode: int | None,
+        archive: ArchiveStream | None = None,
+        saved_complete: bool = False,
+        saved_generation: int = 0,
+        generation: int = 0,
+    ) -> None:
+        self.path_key: str = path_key
+        self.app: str | None = app_from_path(Path(path_key))
+        self.f: BinaryIO = f
+        self.inode: int = inode
+        self.archive: ArchiveStream | None = archive
+        self.reader: ChunkedLineReader = ChunkedLineReader(
+            f if archive is None else cast(BinaryIO, archive),
+            offset,
+            settings.SIEM_INGEST_READ_CHUNK_BYTES,
+            settings.SIEM_INGEST_MMAP_MIN_BYTES if archive is None else 0,
+        )
+        self.saved_offset: int | None = saved_offset
+        self.saved_inode: int | None = saved_inode
+        self.saved_complete: bool = saved_complete
+        self.saved_generation: int = saved_generation
+        self.generation: int = generation
+        self.fingerprint: str | None = None
+        # Whether the fingerprint is known to be stored with saved_offset.
+        self.fingerprint_saved: bool = False
+        self.head: bytes = b""
+        self.rotated: bool = False
+        self.closed: bool = False
 
-            if line.strip() == b"":
-                stats.empty_lines += 1
-                new_offset = line_end_offset
-                current_line_start_offset = line_end_offset
-                continue
+    @classmethod
+    def open(
+        cls,
+        path_key: str,
+        saved_offset: int | None,
+        saved_inode: int | None,
+        saved_complete: bool = False,
+        saved_generation: int = 0,
+    ) -> FileTail | None:
+        try:
+            f = open(path_key, "rb")
+        except FileNotFoundError:
+            return None
 
-            try:
-                parsed_obj: object = json.loads(line)
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                stats.json_errors += 1
-                new_offset = line_end_offset
-                current_line_start_offset = line_end_offset
-                continue
+        st = os.fstat(f.fileno())
+        if is_archive_path(path_key):
+            return cls._open_archive(
+                path_key,
+                f,
+                st.st_ino,
+                saved_offset,
+                saved_inode,
+                saved_complete,
+                saved_generation,
+            )
 
-            if not isinstance(parsed_obj, dict):
-                stats.non_object += 1
-                new_offset = line_end_offset
-                current_line_start_offset = line_end_offset
-                continue
+        start_offset = compute_start_offset(
+            saved_offset or 0, saved_inode, st.st_ino, st.st_size
+        )
+        replaced = (saved_offset is not None and start_offset != saved_offset) or (
+            saved_inode is not None and saved_inode != st.st_ino
+        )
+        _ = f.seek(start_offset)
+        tail = cls(
+            path_key,
+            f,
+            st.st_ino,
+            start_offset,
+            saved_offset,
+            saved_inode,
+            saved_generation=saved_generation,
+            generation=saved_generation + int(replaced),
+        )
+        head = os.pread(f.fileno(), FINGERPRINT_BYTES, 0)
+        tail.head = first_line(head)
+        if settings.SIEM_INGEST_ARCHIVES_ENABLED:
+            tail.fingerprint = head_fingerprint(head)
+        return tail
+
+    @classmethod
+    def _open_archive(
+        cls,
+        path_key: str,
+        f: BinaryIO,
+        inode: int,
+        saved_offset: int | None,
+        saved_inode: int | None,
+        saved_complete: bool,
+        saved_generation: int,
+    ) -> FileTail:
+        # Offsets of an archive count decompressed bytes, so resuming means
+        # decompressing up to the saved offset again; a completed archive is
+        # not decompressed at all.
+        same_file = saved_inode == inode
+        start_offset = (saved_offset or 0) if same_file else 0
+        archive = ArchiveStream(f, path_key, finished=same_file and saved_complete)
+        fingerprint = None
+        if not archive.finished:
+            fingerprint = head_fingerprint(archive.peek(FINGERPRINT_BYTES))
+            start_offset = archive.skip(start_offset)
+        tail = cls(
+            path_key,
+            f,
+            inode,
+            start_offset,
+            saved_offset,
+            saved_inode,
+            archive,
+            saved_complete,
+            saved_generation,
+            saved_generation + int(saved_inode is not None and not same_file),
+        )
+        tail.fingerprint = fingerprint
+        return tail
+
+    @property
+    def offset(self) -> int:
+        return self.reader.offset
+
+    def skip_to(self, offset: int) -> None:
+        assert self.archive is not None and self.reader.offset == 0
+        self.reader.offset = self.archive.skip(offset)
+
+    @property
+    def complete(self) -> bool:
+        return (
+            self.archive is not None and self.archive.finished and self.reader.drained
+        )
+
+    def is_saved(self, offset: int, complete: bool = False) -> bool:
+        return (
+            self.saved_offset == offset
+            and self.saved_inode == self.inode
+            and self.saved_complete == complete
+            and self.saved_generation == self.generation
+        )
+
+    def mark_saved(self, offset: int, complete: bool = False) -> None:
+        self.saved_offset = offset
+        self.saved_inode = self.inode
+        self.saved_complete = complete
+        self.saved_generation = self.generation
+
+    def truncated(self) -> bool:
+        """
+        True if the file was truncated in place (copytruncate) since it was
+        opened: it is now shorter than what was read, or its first line no
+        longer matches even though it grew past the old offset again.
+        """
+        fd = self.f.fileno()
+        if os.fstat(fd).st_size < self.reader.position:
+            return True
+        if self.head == b"":
+            self.head = first_line(os.pread(fd, FINGERPRINT_BYTES, 0))
+            return False
+        return os.pread(fd, len(self.head), 0) != self.head
+
+    def successor(self) -> FileTail | None:
+        """Opens the file that now lives at path_key, from its start."""
+        tail = FileTail.open(self.path_key, None, None)
+        if tail is not None:
+            tail.generation = self.generation + 1
+        return tail
 
-            parsed = cast(dict[str, object], parsed_obj)
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.reader.close()
+        if self.archive is not None:
+            self.archive.close()
+        self.f.close()
+
+    def read_batch(self, max_lines: int = 200) -> TailResult:
+        result = read_new_lines(
+            self.reader,
+            build_context(self.app, self.path_key, source_generation=self.generation),
+            max_lines=max_lines,
+        )
+        result.inode = self.inode
+        return result
+
+
+class TailCache:
+    """
+    Open FileTails kept between ingest cycles, keyed by path, so a file is
+    neither reopened nor re-read while it keeps growing. take() re-validates
+    a cached handle: when the path now names another inode (or nothing) the
+    old handle is returned with rotated set, so the caller drains it to EOF
+    before moving on to successor(); when the file was truncated in place
+    it is reopened from its start. At most max_open tails are kept, least
+    recently used closed first; a closed one is reopened from its saved
+    offset like any other file.
+    """
+
+    def __init__(self, max_open: int) -> None:
+        self.max_open: int = max_open
+        self._tails: OrderedDict[str, FileTail] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def take(self, path_key: str) -> FileTail | None:
+        with self._lock:
+            tail = self._tails.pop(path_key, None)
+        if tail is None:
+            return None
+
+        try:
+            inode = os.stat(path_key).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != tail.inode:
+            tail.rotated = True
+            return tail
+        if tail.truncated():
+            tail.close()
+            return tail.successor()
+        return tail
+
+    def release(self, tail: FileTail) -> None:
+        if tail.closed or tail.archive is not None:
+            tail.close()
+            return
+        closing: list[FileTail] = []
+        with self._lock:
+            previous = self._tails.pop(tail.path_key, None)
+            if previous is not None and previous is not tail:
+                closing.append(previous)
+            self._tails[tail.path_key] = tail
+            while len(self._tails) > max(self.max_open, 1):
+                closing.append(self._tails.popitem(last=False)[1])
+        for old in closing:
+            old.close()
+
+    def stale_paths(self) -> list[Path]:
+        """Cached paths rotated away since; their old file still needs draining."""
+        with self._lock:
+            tails = list(self._tails.values())
+        stale: list[Path] = []
+        for tail in tails:
             try:
-                incoming = IncomingLogEvent.model_validate(parsed)
+                inode = os.stat(tail.path_key).st_ino
+            except FileNotFoundError:
+                inode = None
+            if inode != tail.inode:
+                stale.append(Path(tail.path_key))
+        return stale
 
-            except ValidationError:
-                stats.validation_errors += 1
-                new_offset = line_end_offset
-                current_line_start_offset = line_end_offset
-                continue
+    def clear(self) -> None:
+        with self._lock:
+            tails = list(self._tails.values())
+            self._tails = OrderedDict()
+        for tail in tails:
+            tail.close()
 
-            events.append(
-                build_event(
-                    incoming,
-                    raw_line=line,
-                    file_path=fp,
-                    source_file=path_key,
-                    source_offset=current_line_start_offset,
-                    received_at=received_at_now,
-                )
-            )
 
-            new_offset = line_end_offset
-            current_line_start_offset = line_end_offset
+def parse_line(
+    line: bytes,
+    source_offset: int | None,
+    ctx: NormalizeContext,
+    stats: Stats,
+    fast_parse: bool = True,
+) -> EventRow | None:
+    if line.strip() == b"":
+        stats.empty_lines += 1
+        return None
+
+    try:
+        parsed_obj: object = loads_line(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        stats.json_errors += 1
+        return None
+
+    if not isinstance(parsed_obj, dict):
+        stats.non_object += 1
+        return None
+
+    parsed = cast(dict[str, object], parsed_obj)
+    incoming: IncomingLogEvent | IncomingFields | None = (
+        fast_incoming(parsed) if fast_parse else None
+    )
+    if incoming is None:
+        try:
+            incoming = IncomingLogEvent.model_validate(parsed)
+
+        except ValidationError:
+            stats.validation_errors += 1
+            return None
+
+    return build_event(incoming, raw_line=line, source_offset=source_offset, ctx=ctx)
+
+
+def read_new_lines(
+    reader: ChunkedLineReader, ctx: NormalizeContext, *, max_lines: int = 200
+) -> TailResult:
+    stats = Stats()
+    events: list[EventRow] = []
+    fast_parse = settings.SIEM_INGEST_FAST_PARSE
+
+    line_count = 0
+    while line_count < max_lines:
+        line_start_offset = reader.offset
+        line = reader.next_line()
+        if line is None:
+            if reader.has_partial:
+                stats.incomplete_lines += 1
+            break
+
+        line_count += 1
+        row = parse_line(line, line_start_offset, ctx, stats, fast_parse)
+        if row is not None:
+            events.append(row)
 
-    return TailResult(events=events, new_offset=new_offset, inode=inode, stats=stats)
+    return TailResult(
+        events=events, new_offset=reader.offset, line_count=line_count, stats=stats
+    )
@@ -1,5 +1,6 @@
+import hashlib
 import json
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from config import settings
@@ -22,6 +23,29 @@ def compute_start_offset(
     return saved_offset
 
 
+FINGERPRINT_BYTES = 4096
+
+
+def first_line(head: bytes) -> bytes:
+    """
+    The first complete line of head, or its first FINGERPRINT_BYTES bytes
+    when that line is longer; b"" while the first line is still incomplete.
+    """
+    end = head.find(b"\n")
+    if end >= 0:
+        return head[: min(end + 1, FINGERPRINT_BYTES)]
+    return head[:FINGERPRINT_BYTES] if len(head) >= FINGERPRINT_BYTES else b""
+
+
+def head_fingerprint(head: bytes) -> str | None:
+    """
+    Identifies a log by its first line, so a compressed archive can be
+    matched to the live file it was rotated from.
+    """
+    line = first_line(head)
+    return hashlib.sha1(line).hexdigest() if line else None
+
+
 def app_from_path(file_path: Path) -> str | None:
     log_root = Path(settings.SIEM_LOG_DIR).resolve()
     fp = file_path.resolve()
@@ -70,6 +94,16 @@ def cap_text(
     return value[:max_len]
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def dt_to_epoch_us(dt: datetime) -> int:
+    """Microseconds since the epoch; naive datetimes are taken as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
 def dt_to_utc_rfc3339_z(dt: datetime) -> str:
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
@@ -1,17 +1,153 @@
 from datetime import timedelta, datetime, timezone
-from sqlmodel import Session, col
-from sqlalchemy import delete
-from ingest.utils import dt_to_utc_rfc3339_z
+from time import sleep
+from typing import NamedTuple
+from sqlmodel import Session
+from config import settings
+from ingest.utils import dt_to_epoch_us
 from models.models import Event
+from repositories.dictionary import values
+from repositories.file_offsets import delete_fingerprints_before
+from repositories.partitions import (
+    day_number,
+    day_us,
+    drop_partitions_before,
+    list_partitions,
+    partition_name,
+)
 
 
-def run_retention_once(session: Session, retention_days: int) -> int:
+class RetentionResult(NamedTuple):
+    deleted: int
+    # False when the chunk budget ran out before everything expired was
+    # deleted; the next run continues.
+    finished: bool
+
+
+class _Rule(NamedTuple):
+    where: str
+    params: tuple[object, ...]
+    cutoff: int
+
+
+def _cutoff(now_utc: datetime, days: int) -> datetime:
+    return now_utc - timedelta(days=days)
+
+
+def _rules(
+    now_utc: datetime, retention_days: int, app_id_days: dict[int, int]
+) -> list[_Rule]:
+    rules: list[_Rule] = []
+    for app_id, days in sorted(app_id_days.items()):
+        cutoff = dt_to_epoch_us(_cutoff(now_utc, days))
+        rules.append(_Rule("app_id = ? AND ts_us < ?", (app_id, cutoff), cutoff))
+
+    cutoff = dt_to_epoch_us(_cutoff(now_utc, retention_days))
+    where = "ts_us < ?"
+    if app_id_days:
+        placeholders = ", ".join("?" for _ in app_id_days)
+        where += f" AND (app_id IS NULL OR app_id NOT IN ({placeholders}))"
+    rules.append(_Rule(where, (cutoff, *sorted(app_id_days)), cutoff))
+    return rules
+
+
+def _incremental_vacuum(session: Session, pages: int) -> None:
+    # incremental_vacuum frees one page per step, and only executescript
+    # steps a statement that returns no rows to completion. It is a no-op
+    # unless the database was created with auto_vacuum=INCREMENTAL.
+    if pages <= 0:
+        return
+    dbapi_conn = session.connection().connection.driver_connection
+    if dbapi_conn is not None:
+        dbapi_conn.executescript(f"PRAGMA incremental_vacuum({pages})")
+
+
+def run_retention_once(
+    session: Session,
+    retention_days: int,
+    app_days: dict[str, int] | None = None,
+    chunk_rows: int = 5000,
+    max_chunks: int = 0,
+    pause_seconds: float = 0,
+    vacuum_pages: int = 0,
+) -> RetentionResult:
+    """
+    Deletes expired events in chunks of at most chunk_rows, each in its own
+    transaction with pause_seconds between them, so the writer is held only
+    briefly. Stops after max_chunks chunks (0 = no limit). app_days
+    overrides retention_days per app.
+    """
     now_utc = datetime.now(timezone.utc)
-    cutoff_dt = now_utc - timedelta(days=retention_days)
-    cutoff_str = dt_to_utc_rfc3339_z(cutoff_dt)
+    app_days = app_days or {}
+    chunk_rows = max(chunk_rows, 1)
+    # Apps that were never stored have no events to delete.
+    app_id_days: dict[int, int] = {}
+    for app, days in app_days.items():
+        for app_id in values.ids_of(session.connection(), "app", [app]):
+            app_id_days[app_id] = days
+    rules = _rules(now_utc, retention_days, app_id_days)
+    keep_cutoff = _cutoff(now_utc, max([retention_days, *app_days.values()]))
+    deleted = 0
 
-    stmt = delete(Event).where(col(Event.ts) < cutoff_str)
-    result = session.exec(stmt)
+    if settings.SIEM_PARTITION_ENABLED:
+        # Partitions are dropped once the longest retention has passed for
+        # all of their days; everything else, including the expired days of
+        # a partition that also holds newer ones, is deleted row by row.
+        _, deleted = drop_partitions_before(
+            session.connection(), day_number(keep_cutoff.date())
+        )
+        session.commit()
+        tables = {
+            partition_name(day): day_us(day)
+            for day in list_partitions(session.connection())
+        }
+    else:
+        tables = {Event.__tablename__: 0}
+
+    # Only chunks that deleted rows count against max_chunks; finding
+    # nothing to delete is an index lookup. Each chunk deletes the oldest
+    # matching rows and the next one starts at the newest ts_us deleted, so
+    # rows the rule keeps (other apps') are walked past once, not per chunk.
+    chunks = 0
+    for rule in rules:
+        for table, first_us in tables.items():
+            if first_us >= rule.cutoff:
+                continue
+            lower_us = -(2**63)
+            while True:
+                if max_chunks > 0 and chunks >= max_chunks:
+                    _incremental_vacuum(session, vacuum_pages)
+                    return RetentionResult(deleted, False)
+                deleted_ts = (
+                    session.connection()
+                    .exec_driver_sql(
+                        f"DELETE FROM {table} WHERE id IN ("
+                        f"SELECT id FROM {table} WHERE {rule.where} AND ts_us >= ? "
+                        f"ORDER BY ts_us LIMIT {chunk_rows}) RETURNING ts_us",
+                        (*rule.params, lower_us),
+                    )
+                    .scalars()
+                    .all()
+                )
+                session.commit()
+                if not deleted_ts:
+                    break
+                chunks += 1
+                deleted += len(deleted_ts)
+                if len(deleted_ts) < chunk_rows:
+                    break
+                lower_us = max(deleted_ts)
+                if pause_seconds > 0:
+                    sleep(pause_seconds)
+
+    # An archive found after this long would only bring back expired events.
+    _ = delete_fingerprints_before(
+        session, keep_cutoff.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    )
+    # Everything before keep_cutoff is deleted now, so are values only those
+    # events used.
+    unused = values.delete_unused(session.connection(), dt_to_epoch_us(keep_cutoff))
     session.commit()
-    rowcount = result.rowcount or 0
-    return rowcount
+    values.forget(unused)
+
+    _incremental_vacuum(session, vacuum_pages)
+    return RetentionResult(deleted, True)
@@ -1,12 +1,16 @@
 import threading
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime, timezone
 from config import settings
+from ingest.discovery import DiscoveryIndex
 from ingest.ingest import ingest_loop
-from routers import auth, events, metadata, ready, metrics
+from ingest.push import PushQueue
+from ingest.receiver import SocketReceiver
+from repositories.source_files import source_files
+from routers import auth, events, ingest, metadata, ready, metrics
 from db import init_db
 from schemas.ingest import IngestState
 
@@ -16,32 +20,61 @@ DB_PATH = Path(settings.SIEM_DB_PATH)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    from models.models import Event, FileOffset
+    from models.models import DictValue, Event, FileFingerprint, FileOffset
 
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     init_db()
+    if not settings.SIEM_INGEST_ENABLED:
+        # Nothing else scans the log directory; /health reports this scan.
+        _ = app.state.discovery_index.refresh()
     stop_event = threading.Event()
     thread: threading.Thread | None = None
 
     app.state.ingest_stop_event = stop_event
     app.state.ingest_thread = None
+    receiver: SocketReceiver | None = None
 
     if settings.SIEM_INGEST_ENABLED:
         thread = threading.Thread(
             target=ingest_loop,
-            args=(stop_event, app.state.ingest_lock, app.state.ingest_state),
+            args=(
+                stop_event,
+                app.state.ingest_lock,
+                app.state.ingest_state,
+                app.state.discovery_index,
+                app.state.push_queue,
+            ),
             name="mini-siem-ingestor",
             daemon=True,
         )
         thread.start()
         app.state.ingest_thread = thread
 
+    if app.state.push_queue is not None and (
+        settings.SIEM_INGEST_SOCKET_PATH or settings.SIEM_INGEST_TCP_PORT
+    ):
+        receiver = SocketReceiver(
+            app.state.push_queue,
+            settings.SIEM_INGEST_SOCKET_PATH,
+            settings.SIEM_INGEST_TCP_HOST,
+            settings.SIEM_INGEST_TCP_PORT,
+            settings.SIEM_INGEST_SOCKET_MAX_LINE_BYTES,
+            settings.SIEM_INGEST_FAST_PARSE,
+        )
+        receiver.start()
+    app.state.socket_receiver = receiver
+
     try:
         yield
     finally:
+        if receiver is not None:
+            receiver.stop()
         stop_event.set()
+        if app.state.push_queue is not None:
+            app.state.push_queue.close()
         if thread is not None:
             thread.join(timeout=5)
+        source_files.close()
 
 
 app = FastAPI(title="Mini-SIEM", version="0.0.1", lifespan=lifespan)
@@ -54,6 +87,19 @@ app.state.ingest_state = IngestState(
     last_retention_deleted=0,
     last_retention_error=None,
 )
+app.state.discovery_index = DiscoveryIndex(LOG_DIR)
+app.state.socket_receiver = None
+# Pushed events are written by the ingest thread, so push needs it running.
+app.state.push_queue = (
+    PushQueue(settings.SIEM_INGEST_PUSH_QUEUE_EVENTS)
+    if settings.SIEM_INGEST_ENABLED
+    and (
+        settings.SIEM_INGEST_PUSH_ENABLED
+        or settings.SIEM_INGEST_SOCKET_PATH
+        or settings.SIEM_INGEST_TCP_PORT
+    )
+    else None
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -65,19 +111,21 @@ app.add_middleware(
 
 app.include_router(auth.router)
 app.include_router(events.router)
+app.include_router(ingest.router)
 app.include_router(metadata.router)
 app.include_router(ready.router)
 app.include_router(metrics.router)
 
 
 @app.get("/health")
-def health():
+def health(request: Request):
     now = datetime.now(timezone.utc).isoformat()
 
-    logs_exists = LOG_DIR.exists()
-    jsonl_files = []
-    if logs_exists:
-        jsonl_files = [str(p) for p in LOG_DIR.rglob("*.jsonl")][:50]
+    # The last scan of the ingest thread; a full scan here would hold up the
+    # request on a large log directory.
+    index: DiscoveryIndex = request.app.state.discovery_index
+    logs_exists = index.log_dir_exists
+    jsonl_files = index.file_paths(limit=50)
 
     return {
         "status": "ok",
@@ -3,22 +3,30 @@ from __future__ import annotations
 from typing import ClassVar
 from sqlmodel import Field
 from sqlalchemy import Index
-from schemas.event import EventCore, EventPayload
-from schemas.fileoffset import FileOffsetBase
+from schemas.dictionary import DictValueBase
+from schemas.event import EventColumns
+from schemas.fileoffset import FileFingerprintBase, FileOffsetBase
 
 
-class Event(EventCore, EventPayload, table=True):
+class Event(EventColumns, table=True):
     __tablename__: ClassVar[str] = "events"
 
     id: int | None = Field(default=None, primary_key=True)
 
     __table_args__: ClassVar[tuple[object, ...]] = (
-        Index("events_ts_desc", "ts"),
-        Index("events_app_ts", "app", "ts"),
-        Index("events_event_type_ts", "event_type", "ts"),
-        Index("events_src_ip_ts", "src_ip", "ts"),
-        Index("events_user_id_ts", "user_id", "ts"),
+        Index("events_ts_us", "ts_us"),
+        Index("events_app_ts_us", "app_id", "ts_us"),
+        Index("events_event_type_ts_us", "event_type_id", "ts_us"),
+        Index("events_src_ip_ts_us", "src_ip", "ts_us"),
+        Index("events_user_id_ts_us", "user_id", "ts_us"),
         Index("events_request_id", "request_id"),
+        Index(
+            "events_source_line",
+            "source_file_id",
+            "source_offset",
+            "source_generation",
+            unique=True,
+        ),
         {"sqlite_autoincrement": True},
     )
 
@@ -26,3 +34,17 @@ class Event(EventCore, EventPayload, table=True):
 class FileOffset(FileOffsetBase, table=True):
     __tablename__: ClassVar[str] = "file_offsets"
     path: str = Field(primary_key=True)
+
+
+class FileFingerprint(FileFingerprintBase, table=True):
+    __tablename__: ClassVar[str] = "file_fingerprints"
+    fingerprint: str = Field(primary_key=True)
+
+
+class DictValue(DictValueBase, table=True):
+    __tablename__: ClassVar[str] = "dict_values"
+    id: int | None = Field(default=None, primary_key=True)
+
+    __table_args__: ClassVar[tuple[object, ...]] = (
+        Index("dict_values_kind_value", "kind", "value", unique=True),
+    )
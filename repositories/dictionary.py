@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from sqlalchemy.engine import Connection
+
+from config import settings
+from models.models import DictValue
+from schemas.event import DICT_COLUMNS, PAYLOAD_COLUMNS, EventRow
+
+_STORED_POSITIONS: tuple[int, ...] = tuple(
+    i for i, name in enumerate(EventRow._fields) if name not in PAYLOAD_COLUMNS
+)
+_DICT_POSITIONS: tuple[tuple[int, str], ...] = tuple(
+    (_STORED_POSITIONS.index(EventRow._fields.index(kind)), kind)
+    for kind in DICT_COLUMNS
+)
+_TABLE = DictValue.__tablename__
+_DAY_US = 86_400_000_000
+
+
+class ValueDictionary:
+    """
+    Cache of dict_values in both directions, shared by the writer and the
+    API, holding at most max_cached values (0 = no limit), oldest dropped
+    first. Values the writer adds are forgotten again if its transaction
+    rolls back, since their ids may then be handed out to other values.
+
+    Every value records in last_ts_us the end of the latest day it was
+    stored for, so once retention has deleted everything before that the
+    value can be deleted too.
+    """
+
+    def __init__(self, max_cached: int = 0) -> None:
+        self.max_cached: int = max_cached
+        self._ids: dict[tuple[str, str], int] = {}
+        self._values: dict[int, str] = {}
+        self._pending: list[tuple[str, str]] = []
+        # last_ts_us the writer has stored per id, to touch each once a day.
+        self._touched: dict[int, int] = {}
+        # Bumped when values are deleted, so a lookup that read them before
+        # does not put them back into the cache.
+        self._generation: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def _trim(self, cache: dict[Any, Any]) -> None:
+        if self.max_cached > 0:
+            while len(cache) > self.max_cached:
+                del cache[next(iter(cache))]
+
+    def _remember(self, kind: str, value: str, id: int) -> None:
+        self._ids[(kind, value)] = id
+        self._values[id] = value
+        self._trim(self._ids)
+        self._trim(self._values)
+
+    def _intern(self, conn: Connection, kind: str, value: str, last_us: int) -> int:
+        id = conn.exec_driver_sql(
+            f"SELECT id FROM {_TABLE} WHERE kind = ? AND value = ?", (kind, value)
+        ).scalar()
+        if id is None:
+            id = conn.exec_driver_sql(
+                f"INSERT INTO {_TABLE} (kind, value, last_ts_us) VALUES (?, ?, ?)",
+                (kind, value, last_us),
+            ).lastrowid
+            self._pending.append((kind, value))
+            self._touched[int(id)] = last_us
+            self._trim(self._touched)
+        self._remember(kind, value, int(id))
+        return int(id)
+
+    def encode(
+        self, conn: Connection, rows: Sequence[EventRow]
+    ) -> list[tuple[object, ...]]:
+        """Rows in STORED_COLUMNS order, adding new values on conn."""
+        encoded: list[tuple[object, ...]] = []
+        ids = self._ids
+        touched = self._touched
+        touch: dict[int, int] = {}
+        with self._lock:
+            for row in rows:
+                values = [row[i] for i in _STORED_POSITIONS]
+                last_us = (row.ts_us // _DAY_US + 1) * _DAY_US
+                for position, kind in _DICT_POSITIONS:
+                    value = values[position]
+                    if value is not None:
+                        id = ids.get((kind, value))
+                        if id is None:
+                            id = self._intern(conn, kind, value, last_us)
+                        if touch.get(id, touched.get(id, -1)) < last_us:
+                            touch[id] = last_us
+                        values[position] = id
+                encoded.append(tuple(values))
+            if touch:
+                _ = conn.exec_driver_sql(
+                    f"UPDATE {_TABLE} SET last_ts_us = ? "
+                    f"WHERE id = ? AND coalesce(last_ts_us, -1) < ?",
+                    [(last_us, id, last_us) for id, last_us in touch.items()],
+                )
+                touched.update(touch)
+                self._trim(touched)
+        return encoded
+
+    def ids_of(self, conn: Connection, kind: str, values: Iterable[str]) -> list[int]:
+        """Ids of the values that exist; unknown values are left out."""
+        found: dict[str, int] = {}
+        missing: list[str] = []
+        for value in set(values):
+            id = self._ids.get((kind, value))
+            if id is None:
+                missing.append(value)
+            else:
+                found[value] = id
+        if missing:
+            generation = self._generation
+            rows = conn.exec_driver_sql(
+                f"SELECT id, value FROM {_TABLE} WHERE kind = ? "
+                f"AND value IN ({', '.join('?' for _ in missing)})",
+                (kind, *missing),
+            ).all()
+            with self._lock:
+                for id, value in rows:
+                    found[value] = id
+                    if generation == self._generation:
+                        self._remember(kind, value, id)
+        return list(found.values())
+
+    def values_of(self, conn: Connection, ids: Iterable[int | None]) -> dict[int, str]:
+        found: dict[int, str] = {}
+        missing: list[int] = []
+        for id in {id for id in ids if id is not None}:
+            value = self._values.get(id)
+            if value is None:
+                missing.append(id)
+            else:
+                found[id] = value
+        if missing:
+            generation = self._generation
+            rows = conn.exec_driver_sql(
+                f"SELECT id, kind, value FROM {_TABLE} "
+                f"WHERE id IN ({', '.join('?' for _ in missing)})",
+                tuple(missing),
+            ).all()
+            with self._lock:
+                for id, kind, value in rows:
+                    found[id] = value
+                    if generation == self._generation:
+                        self._remember(kind, value, id)
+        return found
+
+    def delete_unused(
+        self, conn: Connection, before_us: int
+    ) -> list[tuple[int, str, str]]:
+        """
+        Deletes values stored only for events before before_us, which
+        retention must already have deleted, and returns their (id, kind,
+        value). The newest id is kept, so SQLite never hands a deleted id
+        out again. Call forget() with the result once committed.
+        """
+        return [
+            (id, kind, value)
+            for id, kind, value in conn.exec_driver_sql(
+                f"DELETE FROM {_TABLE} WHERE last_ts_us <= ? "
+                f"AND id < (SELECT max(id) FROM {_TABLE}) RETURNING id, kind, value",
+                (before_us,),
+            )
+        ]
+
+    def forget(self, deleted: Iterable[tuple[int, str, str]]) -> None:
+        with self._lock:
+            self._generation += 1
+            for id, kind, value in deleted:
+                _ = self._ids.pop((kind, value), None)
+                _ = self._values.pop(id, None)
+                _ = self._touched.pop(id, None)
+
+    def commit(self) -> None:
+        with self._lock:
+            self._pending.clear()
+
+    def rollback(self) -> None:
+        with self._lock:
+            for key in self._pending:
+                id = self._ids.pop(key, None)
+                if id is not None:
+                    _ = self._values.pop(id, None)
+            self._pending.clear()
+            # last_ts_us updates were rolled back too.
+            self._touched.clear()
+
+
+values = ValueDictionary(settings.SIEM_DICT_CACHE_SIZE)
@@ -1,6 +1,15 @@
 from collections.abc import Sequence
+from sqlalchemy import func
 from sqlmodel import Session, select, desc
+from config import settings
 from models.models import Event
+from repositories.partitions import (
+    insert_partitioned_rows,
+    insert_rows,
+    list_partitions,
+    partition_entity,
+)
+from schemas.event import EventRow
 
 
 def insert_events_batch(session: Session, events: Sequence[Event]) -> int:
@@ -8,6 +17,41 @@ def insert_events_batch(session: Session, events: Sequence[Event]) -> int:
     return len(events)
 
 
+def insert_event_rows(session: Session, rows: Sequence[EventRow]) -> int:
+    if not rows:
+        return 0
+    if settings.SIEM_PARTITION_ENABLED:
+        return insert_partitioned_rows(session.connection(), rows)
+    return insert_rows(session.connection(), Event.__tablename__, rows)
+
+
+def _entities(session: Session) -> list[type[Event]]:
+    """The tables events are stored in, newest first."""
+    if not settings.SIEM_PARTITION_ENABLED:
+        return [Event]
+    return [
+        partition_entity(day)
+        for day in reversed(list_partitions(session.connection()))
+    ]
+
+
 def query_latest_events(session: Session, limit: int = 200) -> list[Event]:
-    stmt = select(Event).order_by(desc(Event.ts), desc(Event.id)).limit(limit)
-    return list(session.exec(stmt).all())
+    # Partitions hold disjoint ts ranges, so the newest ones fill the page.
+    events: list[Event] = []
+    for entity in _entities(session):
+        stmt = (
+            select(entity)
+            .order_by(desc(entity.ts_us), desc(entity.id))
+            .limit(limit - len(events))
+        )
+        events.extend(session.exec(stmt).all())
+        if len(events) >= limit:
+            break
+    return events
+
+
+def count_events(session: Session) -> int:
+    return sum(
+        session.exec(select(func.count()).select_from(entity)).one()
+        for entity in _entities(session)
+    )
@@ -1,5 +1,7 @@
-from sqlmodel import Session
-from models.models import FileOffset
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, col
+from models.models import FileFingerprint, FileOffset
 
 
 def get_offset(session: Session, path: str) -> FileOffset | None:
@@ -7,13 +9,57 @@ def get_offset(session: Session, path: str) -> FileOffset | None:
 
 
 def upsert_offset(
-    session: Session, path: str, inode: int, offset: int, updated_at: str
+    session: Session,
+    path: str,
+    inode: int,
+    offset: int,
+    updated_at: str,
+    complete: bool = False,
+    generation: int = 0,
 ) -> None:
-    row = get_offset(session, path)
-    if row is None:
-        row = FileOffset(path=path, inode=inode, offset=offset, updated_at=updated_at)
-        session.add(row)
-    else:
-        row.inode = inode
-        row.offset = offset
-        row.updated_at = updated_at
+    completed_at = updated_at if complete else None
+    stmt = insert(FileOffset).values(
+        path=path,
+        inode=inode,
+        offset=offset,
+        updated_at=updated_at,
+        completed_at=completed_at,
+        generation=generation,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FileOffset.path],
+        set_={
+            "inode": inode,
+            "offset": offset,
+            "updated_at": updated_at,
+            "completed_at": completed_at,
+            "generation": generation,
+        },
+    )
+    _ = session.exec(stmt)
+
+
+def get_fingerprint_offset(session: Session, fingerprint: str) -> int | None:
+    row = session.get(FileFingerprint, fingerprint)
+    return None if row is None else row.offset
+
+
+def upsert_fingerprint(
+    session: Session, fingerprint: str, offset: int, updated_at: str
+) -> None:
+    stmt = insert(FileFingerprint).values(
+        fingerprint=fingerprint, offset=offset, updated_at=updated_at
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FileFingerprint.fingerprint],
+        set_={"offset": offset, "updated_at": updated_at},
+    )
+    _ = session.exec(stmt)
+
+
+def delete_fingerprints_before(session: Session, updated_before: str) -> int:
+    """Forgets fingerprints of files not seen since updated_before."""
+    stmt = delete(FileFingerprint).where(
+        col(FileFingerprint.updated_at) < updated_before
+    )
+    return session.connection().execute(stmt).rowcount
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import Integer, column, text
+from sqlalchemy.sql.selectable import TextualSelect
+from sqlalchemy.engine import Connection
+
+# Indexed with the unicode61 tokenizer: q matches whole words, not
+# substrings.
+FTS_COLUMNS: tuple[str, ...] = ("message", "http_path", "error_type", "user_agent")
+
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w")
+
+
+def fts_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def _trigger_statements(table_name: str) -> tuple[str, ...]:
+    fts = fts_name(table_name)
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {fts} ({fts}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new_values});"
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} "
+        f"BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table_name} "
+        f"BEGIN {delete_old} {insert_new} END",
+    )
+
+
+def create_fts(conn: Connection, table_name: str) -> bool:
+    """
+    Creates the full-text index of an events table and the triggers that
+    keep it in step with inserts and deletes, in the same transaction.
+    Rows already in the table are indexed. Returns False if it existed.
+    """
+    fts = fts_name(table_name)
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+    ).first()
+    if exists is None:
+        _ = conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(FTS_COLUMNS)}, "
+            f"content='{table_name}', content_rowid='id')"
+        )
+    for statement in _trigger_statements(table_name):
+        _ = conn.exec_driver_sql(statement)
+    if exists is None:
+        _ = conn.exec_driver_sql(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    return exists is None
+
+
+def drop_fts(conn: Connection, table_name: str) -> None:
+    fts = fts_name(table_name)
+    for suffix in ("ai", "ad", "au"):
+        _ = conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+    _ = conn.exec_driver_sql(f"DROP TABLE IF EXISTS {fts}")
+
+
+def match_expression(q: str) -> str | None:
+    """
+    Turns a search string into an FTS5 query that cannot be a syntax error.
+    Words are ANDed, "quoted text" is a phrase and a trailing * makes a
+    prefix search. None when q has no word to search for.
+    """
+    terms: list[str] = []
+    for phrase, word in _TERM.findall(q):
+        term = phrase or word
+        prefix = not phrase and term.endswith("*")
+        term = term.rstrip("*") if prefix else term
+        if not _WORD.search(term):
+            continue
+        quoted = '"' + term.replace('"', '""') + '"'
+        terms.append(quoted + "*" if prefix else quoted)
+    return " AND ".join(terms) if terms else None
+
+
+def match_ids(table_name: str, expression: str) -> TextualSelect:
+    fts = fts_name(table_name)
+    return (
+        text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :fts_query")
+        .bindparams(fts_query=expression)
+        .columns(column("rowid", Integer))
+    )
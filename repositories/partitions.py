@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Sequence
+from datetime import date, datetime, timedelta
+
+from typing import Any
+
+from sqlalchemy import Index, MetaData, Table
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateTable
+
+from config import settings
+from models.models import Event
+from repositories.dictionary import values
+from repositories.fts import create_fts, drop_fts
+from repositories.payloads import (
+    PAYLOAD_COLUMNS,
+    create_payloads,
+    drop_payloads,
+    insert_payloads,
+    payloads_name,
+)
+from schemas.event import STORED_COLUMNS, EventRow
+
+# Partition tables are named after the first UTC day they hold, e.g.
+# events_20261018, and hold SIEM_PARTITION_DAYS days of events by ts_us.
+PARTITION_PREFIX = f"{Event.__tablename__}_"
+_PARTITION_GLOB = PARTITION_PREFIX + "[0-9]" * 8
+
+# Ids of a partition start at its first day (days since 1970-01-01) shifted
+# by ID_SHIFT bits, so ids stay unique across partitions and an id names
+# its partition without a lookup.
+ID_SHIFT = 36
+
+_EPOCH = date(1970, 1, 1)
+DAY_US = 86_400_000_000
+# How far past now an event's ts is still trusted to pick its partition.
+_FUTURE_SLACK_DAYS = 2
+_partition_metadata = MetaData()
+_tables: dict[int, Table] = {}
+_tables_lock = threading.Lock()
+# Partitions the writer created or saw during its current transaction.
+_ensured: set[int] = set()
+# Set by the backfill, which builds the indexes, full-text ones included,
+# once it has loaded all rows.
+_defer_indexes = False
+
+
+def day_number(d: date) -> int:
+    return (d - _EPOCH).days
+
+
+def day_date(day: int) -> date:
+    return _EPOCH + timedelta(days=day)
+
+
+def partition_start(day: int) -> int:
+    days = max(settings.SIEM_PARTITION_DAYS, 1)
+    return max(day // days * days, 0)
+
+
+def partition_for_ts_us(ts_us: int) -> int:
+    """First day of the partition that holds an event's ts_us."""
+    return partition_start(ts_us // DAY_US)
+
+
+def partition_window(now_us: int | None = None) -> tuple[int, int]:
+    """
+    [first, end) ts_us within which an event is filed by its own ts: from
+    the longest retention (1970 with retention off) to a little past now.
+    Anything else, such as a year typed wrong or a clock reset, is filed
+    under now, so a bogus ts cannot create partitions retention never drops
+    or ids beyond 2^53.
+    """
+    if now_us is None:
+        now_us = time.time_ns() // 1000
+    first_us = 0
+    if settings.SIEM_RENENTION_ENABLED:
+        keep_days = max(
+            [settings.SIEM_RENENTION_DAYS, *settings.SIEM_RETENTION_APP_DAYS.values()]
+        )
+        first_us = max(now_us - (keep_days + 1) * DAY_US, 0)
+    return first_us, now_us + _FUTURE_SLACK_DAYS * DAY_US
+
+
+def partition_for_event(ts_us: int, window: tuple[int, int]) -> int:
+    """Partition an event with ts_us goes to, given partition_window()."""
+    first_us, end_us = window
+    if first_us <= ts_us < end_us:
+        return partition_for_ts_us(ts_us)
+    return partition_for_ts_us(end_us - _FUTURE_SLACK_DAYS * DAY_US)
+
+
+def partition_for_id(id: int) -> int:
+    return id >> ID_SHIFT
+
+
+def day_us(day: int) -> int:
+    """ts_us of midnight UTC at the start of day."""
+    return day * DAY_US
+
+
+def partition_name(day: int) -> str:
+    return f"{PARTITION_PREFIX}{day_date(day).strftime('%Y%m%d')}"
+
+
+def partition_table(day: int) -> Table:
+    """A copy of the events table, indexes renamed, for one partition."""
+    with _tables_lock:
+        table = _tables.get(day)
+        if table is None:
+            name = partition_name(day)
+            source = Event.__table__  # pyright: ignore[reportAttributeAccessIssue]
+            table = source.to_metadata(_partition_metadata, name=name)
+            for index in table.indexes:
+                index.name = name + str(index.name)[len(Event.__tablename__) :]
+            _tables[day] = table
+        return table
+
+
+def partition_entity(day: int) -> Any:
+    """Event mapped onto a partition, for ORM queries."""
+    return aliased(Event, partition_table(day), adapt_on_names=True)
+
+
+def list_partitions(conn: Connection) -> list[int]:
+    """First days of all partitions, oldest first."""
+    names = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+        (_PARTITION_GLOB,),
+    ).scalars()
+    days = [
+        day_number(datetime.strptime(name[len(PARTITION_PREFIX) :], "%Y%m%d").date())
+        for name in names
+    ]
+    return sorted(days)
+
+
+def partition_ranges(days: Sequence[int]) -> list[tuple[int, int]]:
+    """
+    (first day, end day) of every partition in days, oldest first. A
+    partition ends after SIEM_PARTITION_DAYS, or earlier where the next one
+    starts, should the setting have been lowered since it was created.
+    """
+    span = max(settings.SIEM_PARTITION_DAYS, 1)
+    following = [*days[1:], None]
+    return [
+        (day, day + span if after is None else min(after, day + span))
+        for day, after in zip(days, following)
+    ]
+
+
+def secondary_indexes(table: Table) -> list[Index]:
+    """
+    Indexes of an events table that only speed up queries. The unique one
+    is left out: it is what makes replayed lines a no-op.
+    """
+    return sorted(
+        (index for index in table.indexes if not index.unique),
+        key=lambda index: str(index.name),
+    )
+
+
+def defer_indexes(defer: bool) -> None:
+    """
+    While deferred, partitions are created without their secondary and
+    full-text indexes, which the caller builds afterwards.
+    """
+    global _defer_indexes
+    _defer_indexes = defer
+
+
+def ensure_partition(conn: Connection, day: int) -> Table:
+    table = partition_table(day)
+    if day in _ensured:
+        return table
+    if _defer_indexes:
+        _ = conn.execute(CreateTable(table, if_not_exists=True))
+        for index in table.indexes:
+            if index.unique:
+                index.create(conn, checkfirst=True)
+    else:
+        table.create(conn, checkfirst=True)
+    create_payloads(conn, table.name)
+    if settings.SIEM_FTS_ENABLED and not _defer_indexes:
+        _ = create_fts(conn, table.name)
+    # AUTOINCREMENT continues from sqlite_sequence, so seeding it moves the
+    # partition's ids into its own range.
+    _ = conn.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+        (table.name, day << ID_SHIFT, table.name),
+    )
+    _ensured.add(day)
+    return table
+
+
+def forget_ensured() -> None:
+    """Called on rollback, which may have undone a partition's creation."""
+    _ensured.clear()
+
+
+def insert_sql(table_name: str) -> str:
+    # Lines already stored (same source_file, source_offset and generation)
+    # are skipped, so replaying a window after a crash cannot create
+    # duplicates.
+    return (
+        f"INSERT OR IGNORE INTO {table_name} (id, {', '.join(STORED_COLUMNS)}) "
+        f"VALUES (?, {', '.join('?' for _ in STORED_COLUMNS)})"
+    )
+
+
+def insert_rows(conn: Connection, table_name: str, rows: Sequence[EventRow]) -> int:
+    """
+    Inserts rows into an events table and their payloads into its payload
+    table. Ids are handed out here, continuing from sqlite_sequence as
+    AUTOINCREMENT would, so the payloads can be stored under them.
+    """
+    last = conn.exec_driver_sql(
+        "SELECT seq FROM sqlite_sequence WHERE name = ?", (table_name,)
+    ).scalar()
+    ids = range(int(last or 0) + 1, int(last or 0) + 1 + len(rows))
+    result = conn.exec_driver_sql(
+        insert_sql(table_name),
+        [(id, *row) for id, row in zip(ids, values.encode(conn, rows))],
+    )
+    insert_payloads(
+        conn,
+        table_name,
+        ((id, row.data_json, row.raw_json) for id, row in zip(ids, rows)),
+    )
+    return result.rowcount
+
+
+def _partition_exists(conn: Connection, day: int) -> bool:
+    if day in _ensured:
+        return True
+    return (
+        conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (partition_name(day),),
+        ).first()
+        is not None
+    )
+
+
+def _drop_replayed(conn: Connection, day: int, rows: list[EventRow]) -> list[EventRow]:
+    """
+    Leaves out rows whose source line the partition before day already
+    holds. An event without ts is filed under the time it was read, so a
+    line replayed after midnight lands in a later partition than the first
+    time, out of reach of that partition's source line index.
+    """
+    previous = partition_start(day - 1)
+    if previous == day or not _partition_exists(conn, previous):
+        return rows
+    offsets: dict[tuple[str, int], list[int]] = {}
+    for row in rows:
+        if row.source_file is not None and row.source_offset is not None:
+            key = (row.source_file, row.source_generation)
+            offsets.setdefault(key, []).append(row.source_offset)
+
+    stored: set[tuple[str, int, int]] = set()
+    for (source_file, generation), file_offsets in offsets.items():
+        # A file never stored has no lines in any partition.
+        for file_id in values.ids_of(conn, "source_file", [source_file]):
+            # Lines read for the first time lie past everything the file
+            # stored before, so this range is empty unless lines are replayed.
+            found = conn.exec_driver_sql(
+                f"SELECT source_offset FROM {partition_name(previous)} "
+                f"WHERE source_file_id = ? AND source_offset BETWEEN ? AND ? "
+                f"AND source_generation = ?",
+                (file_id, min(file_offsets), max(file_offsets), generation),
+            ).scalars()
+            stored.update((source_file, generation, offset) for offset in found)
+    if not stored:
+        return rows
+    return [
+        row
+        for row in rows
+        if (row.source_file, row.source_generation, row.source_offset) not in stored
+    ]
+
+
+def insert_partitioned_rows(conn: Connection, rows: Sequence[EventRow]) -> int:
+    window = partition_window()
+    by_partition: dict[int, list[EventRow]] = {}
+    for row in rows:
+        by_partition.setdefault(partition_for_event(row.ts_us, window), []).append(
+            row
+        )
+
+    inserted = 0
+    for day, partition_rows in by_partition.items():
+        partition_rows = _drop_replayed(conn, day, partition_rows)
+        if not partition_rows:
+            continue
+        table = ensure_partition(conn, day)
+        inserted += insert_rows(conn, table.name, partition_rows)
+    return inserted
+
+
+def drop_partitions_before(conn: Connection, cutoff_day: int) -> tuple[int, int]:
+    """
+    Drops every partition that ends on or before cutoff_day and returns
+    (partitions dropped, events dropped).
+    """
+    dropped = 0
+    events = 0
+    for day, end in partition_ranges(list_partitions(conn)):
+        if end > cutoff_day:
+            break
+        table = partition_table(day)
+        events += int(
+            conn.exec_driver_sql(f"SELECT count(*) FROM {table.name}").scalar() or 0
+        )
+        drop_fts(conn, table.name)
+        drop_payloads(conn, table.name)
+        table.drop(conn)
+        _ = conn.exec_driver_sql(
+            "DELETE FROM sqlite_sequence WHERE name = ?", (table.name,)
+        )
+        _ensured.discard(day)
+        dropped += 1
+    return dropped, events
+
+
+def migrate_into_partitions(conn: Connection) -> int:
+    """
+    Moves rows of the unpartitioned events table, and their payloads, into
+    partitions. They get new ids in their partition's range.
+    """
+    columns = ", ".join(STORED_COLUMNS)
+    payload_columns = ", ".join(PAYLOAD_COLUMNS)
+    first_us, end_us = partition_window()
+    days = sorted(
+        {
+            partition_for_ts_us(int(day) * DAY_US)
+            for day in conn.exec_driver_sql(
+                f"SELECT DISTINCT ts_us / {DAY_US} FROM {Event.__tablename__} "
+                f"WHERE ts_us >= ? AND ts_us < ?",
+                (first_us, end_us),
+            ).scalars()
+        }
+    )
+    # Rows outside the window go to the oldest or newest partition below,
+    # or, without any rows inside it, to the partition of today.
+    if not days and conn.exec_driver_sql(
+        f"SELECT 1 FROM {Event.__tablename__} LIMIT 1"
+    ).first():
+        days = [partition_for_ts_us(end_us - _FUTURE_SLACK_DAYS * DAY_US)]
+    moved = 0
+    for day, end in partition_ranges(days):
+        table = ensure_partition(conn, day)
+        # The oldest and newest partitions also take the rows beyond them,
+        # including any without ts_us.
+        where = "coalesce(ts_us, 0) >= ? AND coalesce(ts_us, 0) < ?"
+        bounds = (
+            day_us(day) if day != days[0] else -(2**63),
+            day_us(end) if day != days[-1] else 2**63 - 1,
+        )
+        last = conn.exec_driver_sql(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)
+        ).scalar()
+        numbered = (
+            f"SELECT id, ? + row_number() OVER (ORDER BY id) AS new_id "
+            f"FROM {Event.__tablename__} WHERE {where}"
+        )
+        result = conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO {table.name} (id, {columns}) "
+            f"SELECT numbered.new_id, {columns} FROM ({numbered}) AS numbered "
+            f"JOIN {Event.__tablename__} USING (id) ORDER BY id",
+            (last, *bounds),
+        )
+        moved += result.rowcount
+        _ = conn.exec_driver_sql(
+            f"INSERT INTO {payloads_name(table.name)} (id, {payload_columns}) "
+            f"SELECT numbered.new_id, {payload_columns} FROM ({numbered}) AS numbered "
+            f"JOIN {payloads_name(Event.__tablename__)} USING (id) "
+            f"WHERE EXISTS (SELECT 1 FROM {table.name} WHERE id = numbered.new_id)",
+            (last, *bounds),
+        )
+        _ = conn.exec_driver_sql(
+            f"DELETE FROM {Event.__tablename__} WHERE {where}", bounds
+        )
+    return moved
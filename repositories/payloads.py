@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import zlib
+from collections.abc import Iterable
+
+from sqlalchemy.engine import Connection
+
+from schemas.event import PAYLOAD_COLUMNS
+
+# A stored payload starts with a byte naming its format, so the dictionary
+# can change without breaking rows written before.
+_PLAIN = b"\x00"
+_ZLIB_V1 = b"\x01"
+
+# Preset dictionary for short log lines, which zlib alone barely shrinks.
+# zlib favours its end, so the most common strings come last.
+_ZDICT_V1 = (
+    b'"data": {}, "error_type": "", "latency_ms": , "user_agent": "Mozilla/5.0 '
+    b'", "request_id": "", "user_id": "", "src_ip": "", "http_status": 200, '
+    b'"status": 200, "http_method": "GET", "method": "POST", "http_path": "/api/'
+    b'", "path": "/", "timestamp": "", "time": "", "type": "", "msg": "", '
+    b'"host": "", "app": "", "level": "info", "event_type": "", "message": "'
+    b'{"ts": "2026-01-01T00:00:00.000000Z", '
+)
+
+
+def pack_payload(value: str | None, level: int) -> bytes | None:
+    """
+    Encodes data_json or raw_json for storage, compressed unless level is 0
+    or compression does not make it smaller.
+    """
+    if value is None:
+        return None
+    # JSON may carry lone surrogates, which UTF-8 cannot encode.
+    data = value.encode("utf-8", errors="replace")
+    if level > 0:
+        compressor = zlib.compressobj(level, zdict=_ZDICT_V1)
+        packed = compressor.compress(data) + compressor.flush()
+        if len(packed) < len(data):
+            return _ZLIB_V1 + packed
+    return _PLAIN + data
+
+
+def unpack_payload(value: bytes | None) -> str | None:
+    if value is None:
+        return None
+    if value[:1] == _ZLIB_V1:
+        decompressor = zlib.decompressobj(zdict=_ZDICT_V1)
+        return (decompressor.decompress(value[1:]) + decompressor.flush()).decode()
+    return value[1:].decode("utf-8")
+
+
+def payloads_name(table_name: str) -> str:
+    return f"{table_name}_payloads"
+
+
+def create_payloads(conn: Connection, table_name: str) -> None:
+    """
+    Creates the payload table of an events table, with a trigger that
+    deletes an event's payload with it.
+    """
+    payloads = payloads_name(table_name)
+    _ = conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {payloads} ("
+        f"id INTEGER PRIMARY KEY, {', '.join(f'{c} BLOB' for c in PAYLOAD_COLUMNS)})"
+    )
+    _ = conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {payloads}_ad AFTER DELETE ON {table_name} "
+        f"BEGIN DELETE FROM {payloads} WHERE id = old.id; END"
+    )
+
+
+def drop_payloads(conn: Connection, table_name: str) -> None:
+    payloads = payloads_name(table_name)
+    _ = conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {payloads}_ad")
+    _ = conn.exec_driver_sql(f"DROP TABLE IF EXISTS {payloads}")
+
+
+def insert_payloads(
+    conn: Connection,
+    table_name: str,
+    rows: Iterable[tuple[int, bytes | None, bytes | None]],
+) -> None:
+    """
+    Stores (event id, data_json, raw_json) rows already packed. Rows of
+    events the insert skipped as duplicates, or without any payload, are
+    left out.
+    """
+    payloads = payloads_name(table_name)
+    params = [
+        (id, data_json, raw_json, id)
+        for id, data_json, raw_json in rows
+        if data_json is not None or raw_json is not None
+    ]
+    if params:
+        _ = conn.exec_driver_sql(
+            f"INSERT INTO {payloads} (id, {', '.join(PAYLOAD_COLUMNS)}) "
+            f"SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM {table_name} WHERE id = ?)",
+            params,
+        )
+
+
+def load_payload(
+    conn: Connection, table_name: str, id: int
+) -> tuple[str | None, str | None]:
+    """(data_json, raw_json) of one event, decompressed."""
+    row = conn.exec_driver_sql(
+        f"SELECT {', '.join(PAYLOAD_COLUMNS)} FROM {payloads_name(table_name)} "
+        f"WHERE id = ?",
+        (id,),
+    ).first()
+    if row is None:
+        return None, None
+    return unpack_payload(row[0]), unpack_payload(row[1])
+
+
+def move_inline_payloads(conn: Connection, table_name: str, level: int) -> None:
+    """
+    Moves data_json and raw_json of a table written before payloads had
+    their own table into its payload table, compressed, and drops the
+    columns.
+    """
+    driver = conn.connection.driver_connection
+    assert driver is not None
+    driver.create_function(
+        "siem_pack_payload",
+        1,
+        lambda value: pack_payload(value, level),
+        deterministic=True,
+    )
+    columns = ", ".join(PAYLOAD_COLUMNS)
+    packed = ", ".join(f"siem_pack_payload({c})" for c in PAYLOAD_COLUMNS)
+    _ = conn.exec_driver_sql(
+        f"INSERT OR IGNORE INTO {payloads_name(table_name)} (id, {columns}) "
+        f"SELECT id, {packed} FROM {table_name} "
+        f"WHERE {' OR '.join(f'{c} IS NOT NULL' for c in PAYLOAD_COLUMNS)}"
+    )
+    for column in PAYLOAD_COLUMNS:
+        _ = conn.exec_driver_sql(f"ALTER TABLE {table_name} DROP COLUMN {column}")
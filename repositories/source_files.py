@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+
+from config import settings
+
+_READ_BYTES = 65536
+
+
+class SourceFileReader:
+    """
+    Reads single lines back from ingested log files, for events stored
+    without raw_json. Keeps up to max_open files open, least recently used
+    closed first; an open file stays readable after it is rotated away.
+    """
+
+    def __init__(self, max_open: int) -> None:
+        self.max_open: int = max_open
+        self._fds: OrderedDict[str, int] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def _fd_for(self, path: str, inode: int) -> int | None:
+        fd = self._fds.get(path)
+        if fd is not None:
+            if os.fstat(fd).st_ino == inode:
+                self._fds.move_to_end(path)
+                return fd
+            _ = self._fds.pop(path)
+            os.close(fd)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        if os.fstat(fd).st_ino != inode:
+            os.close(fd)
+            return None
+        self._fds[path] = fd
+        while len(self._fds) > max(self.max_open, 1):
+            _, old = self._fds.popitem(last=False)
+            os.close(old)
+        return fd
+
+    def read_line(
+        self, path: str, inode: int, offset: int, max_bytes: int
+    ) -> bytes | None:
+        """
+        The line starting at offset in the file with this inode, without
+        its newline and cut after max_bytes (0 = no limit). None when that
+        file is gone or offset is not the start of a complete line.
+        """
+        start = max(offset - 1, 0)
+        # Held while reading, so no other thread closes the fd meanwhile.
+        with self._lock:
+            fd = self._fd_for(path, inode)
+            if fd is None:
+                return None
+            data = b""
+            while b"\n" not in data[offset - start :]:
+                if max_bytes > 0 and len(data) > max_bytes + offset - start:
+                    break
+                chunk = os.pread(fd, _READ_BYTES, start + len(data))
+                if chunk == b"":
+                    return None
+                data += chunk
+        if offset > 0 and data[:1] != b"\n":
+            return None
+        line = data[offset - start :].split(b"\n", 1)[0]
+        return line[:max_bytes] if max_bytes > 0 else line
+
+    def close(self) -> None:
+        with self._lock:
+            while self._fds:
+                os.close(self._fds.popitem()[1])
+
+
+source_files = SourceFileReader(settings.SIEM_SOURCE_FILE_CACHE_SIZE)
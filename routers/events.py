@@ -2,7 +2,7 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Annotated
 
-from db import SessionLocal
+from db import ReadSessionLocal
 
 from deps import require_admin
 from handlers.events import get_event_details, get_events_all
@@ -31,7 +31,7 @@ def get_events(
     before_ts: Annotated[datetime | None, Query()] = None,
     before_id: Annotated[int | None, Query(ge=1)] = None,
 ):
-    with SessionLocal() as session:
+    with ReadSessionLocal() as session:
         try:
             return get_events_all(
                 session,
@@ -61,7 +61,7 @@ def get_event_by_id(
     _: Annotated[None, Depends(require_admin)],
     id: int,
 ):
-    with SessionLocal() as session:
+    with ReadSessionLocal() as session:
         try:
             return get_event_details(id, session)
         except EventDetailsNotFound:
@@ -0,0 +1,32 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from deps import require_ingest
+from handlers.exceptions import (
+    PushQueueFullError,
+    PushTooLargeError,
+    PushUnavailableError,
+)
+from handlers.ingest import push_ndjson
+from schemas.ingest import PushResult
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+
+@router.post("", status_code=202, response_model=PushResult)
+async def push_events(
+    _: Annotated[None, Depends(require_ingest)],
+    request: Request,
+    app: Annotated[str | None, Query()] = None,
+):
+    try:
+        return await push_ndjson(request, app)
+    except PushQueueFullError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        )
+    except PushTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PushUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
@@ -1,11 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import Annotated
 
 
-from config import settings
-from db import SessionLocal
+from db import ReadSessionLocal
 from deps import require_admin
-from handlers.metadata import get_apps_from_fs, get_event_types_handler
+from handlers.metadata import get_apps_from_index, get_event_types_handler
 from handlers.exceptions import LogDirUnavailableError
 
 router = APIRouter(prefix="/metadata", tags=["metadata"])
@@ -14,9 +13,10 @@ router = APIRouter(prefix="/metadata", tags=["metadata"])
 @router.get("/apps")
 def get_apps(
     _: Annotated[None, Depends(require_admin)],
+    request: Request,
 ) -> list[str]:
     try:
-        return get_apps_from_fs(settings.SIEM_LOG_DIR)
+        return get_apps_from_index(request)
     except LogDirUnavailableError:
         raise HTTPException(status_code=503, detail="Log dir not available")
 
@@ -26,5 +26,5 @@ def get_event_types(
     _: Annotated[None, Depends(require_admin)],
     app: str | None = None,
 ) -> list[str]:
-    with SessionLocal() as session:
+    with ReadSessionLocal() as session:
         return get_event_types_handler(session, app)
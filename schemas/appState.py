@@ -1,8 +1,16 @@
+from __future__ import annotations
+
 from threading import Thread
-from typing import Protocol
+from typing import TYPE_CHECKING, Protocol
 from schemas.ingest import IngestState
 from _thread import LockType
 
+# schemas must not import ingest at runtime: ingest imports schemas.
+if TYPE_CHECKING:
+    from ingest.discovery import DiscoveryIndex
+    from ingest.push import PushQueue
+    from ingest.receiver import SocketReceiver
+
 
 class ReadyAppState(Protocol):
     ingest_thread: Thread | None
@@ -13,3 +21,13 @@ class ReadyAppState(Protocol):
 class MetricsAppState(Protocol):
     ingest_lock: LockType
     ingest_state: IngestState
+    push_queue: PushQueue | None
+    socket_receiver: SocketReceiver | None
+
+
+class MetadataAppState(Protocol):
+    discovery_index: DiscoveryIndex
+
+
+class PushAppState(Protocol):
+    push_queue: PushQueue | None
@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel
+
+
+class DictValueBase(SQLModel):
+    kind: str
+    value: str
+    # Past the ts_us of every event stored with this value: the end of the
+    # latest UTC day one was stored for.
+    last_ts_us: int | None = None
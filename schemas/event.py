@@ -1,5 +1,22 @@
+from typing import NamedTuple
+
 from sqlmodel import SQLModel
 
+# Columns with few distinct values. The events table stores <column>_id, a
+# key into dict_values, instead of repeating the string on every row.
+DICT_COLUMNS: tuple[str, ...] = (
+    "app",
+    "host",
+    "level",
+    "event_type",
+    "http_method",
+    "source_file",
+)
+
+# Kept out of the events tables, which list queries scan, in a side table
+# per events table keyed by event id and compressed.
+PAYLOAD_COLUMNS: tuple[str, ...] = ("data_json", "raw_json")
+
 
 class EventCore(SQLModel):
     ts: str
@@ -29,3 +46,70 @@ class EventPayload(SQLModel):
     raw_json: str | None = None
     source_file: str | None = None
     source_offset: int | None = None
+
+
+class EventColumns(SQLModel):
+    """An events row as stored, with DICT_COLUMNS replaced by their ids."""
+
+    ts: str
+    # ts as microseconds since the epoch, for filtering and ordering.
+    ts_us: int | None = None
+    received_at: str
+
+    app_id: int | None = None
+    host_id: int | None = None
+    level_id: int | None = None
+    event_type_id: int | None = None
+    message: str | None = None
+
+    request_id: str | None = None
+    user_id: str | None = None
+    src_ip: str | None = None
+    user_agent: str | None = None
+
+    http_method_id: int | None = None
+    http_path: str | None = None
+    http_status: int | None = None
+    latency_ms: float | None = None
+
+    error_type: str | None = None
+
+    source_file_id: int | None = None
+    source_offset: int | None = None
+    # Bumped each time a new file takes over source_file (rotation or
+    # truncation), so offsets of different files never collide.
+    source_generation: int = 0
+
+
+class EventRow(NamedTuple):
+    ts: str
+    ts_us: int
+    received_at: str
+    app: str | None
+    host: str | None
+    level: str | None
+    event_type: str | None
+    message: str | None
+    request_id: str | None
+    user_id: str | None
+    src_ip: str | None
+    user_agent: str | None
+    http_method: str | None
+    http_path: str | None
+    http_status: int | None
+    latency_ms: float | None
+    error_type: str | None
+    # Packed with pack_payload.
+    data_json: bytes | None
+    raw_json: bytes | None
+    source_file: str | None
+    source_offset: int | None
+    source_generation: int
+
+
+# EventRow's fields in the order they are inserted into events, after id.
+STORED_COLUMNS: tuple[str, ...] = tuple(
+    f"{name}_id" if name in DICT_COLUMNS else name
+    for name in EventRow._fields
+    if name not in PAYLOAD_COLUMNS
+)
@@ -5,3 +5,10 @@ class FileOffsetBase(SQLModel):
     inode: int | None = None
     offset: int | None = None
     updated_at: str | None = None
+    completed_at: str | None = None
+    generation: int | None = None
+
+
+class FileFingerprintBase(SQLModel):
+    offset: int | None = None
+    updated_at: str | None = None
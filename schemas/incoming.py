@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, NamedTuple
 
 from pydantic import (
     AliasChoices,
@@ -66,7 +66,11 @@ class IncomingLogEvent(BaseModel):
             return None
         if v.tzinfo is None:
             return v.replace(tzinfo=timezone.utc)
-        return v.astimezone(timezone.utc)
+        try:
+            return v.astimezone(timezone.utc)
+        except OverflowError as e:
+            # Near year 1 or 9999 the UTC time can fall outside datetime.
+            raise ValueError("ts out of range") from e
 
     @field_validator("http_status", mode="before")
     @classmethod
@@ -77,7 +81,7 @@ class IncomingLogEvent(BaseModel):
             return None
         try:
             return int(v)
-        except (TypeError, ValueError):
+        except (TypeError, ValueError, OverflowError):
             return None
 
     @field_validator("latency_ms", mode="before")
@@ -89,7 +93,7 @@ class IncomingLogEvent(BaseModel):
             return None
         try:
             return float(v)
-        except (TypeError, ValueError):
+        except (TypeError, ValueError, OverflowError):
             return None
 
     @field_validator(
@@ -123,3 +127,22 @@ class IncomingLogEvent(BaseModel):
             v = v.strip()
             return v or None
         return None
+
+
+class IncomingFields(NamedTuple):
+    ts: datetime | None
+    app: str | None
+    host: str | None
+    level: str | None
+    event_type: str | None
+    message: str | None
+    request_id: str | None
+    user_id: str | None
+    src_ip: str | None
+    user_agent: str | None
+    http_status: int | None
+    http_method: str | None
+    http_path: str | None
+    latency_ms: float | None
+    error_type: str | None
+    data: Any | None
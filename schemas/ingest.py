@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
+from pydantic import SkipValidation
 from sqlmodel import SQLModel, Field
 
-from models.models import Event
+from schemas.event import EventRow
 
 
 class Stats(SQLModel):
@@ -15,9 +16,10 @@ class Stats(SQLModel):
 
 
 class TailResult(SQLModel):
-    events: list[Event] = Field(default_factory=list)
+    events: SkipValidation[list[EventRow]] = Field(default_factory=list)
     new_offset: int = 0
     inode: int | None = None
+    line_count: int = 0
     stats: Stats = Field(default_factory=Stats)
 
 
@@ -25,6 +27,7 @@ class BatchResult(SQLModel):
     inserted_count: int = 0
     new_offset: int = 0
     inode: int | None = None
+    line_count: int = 0
     progressed: bool = False
     stats: Stats = Field(default_factory=Stats)
 
@@ -32,41 +35,75 @@ class BatchResult(SQLModel):
 class FileResult(SQLModel):
     inserted_count: int = 0
     batch_count: int = 0
+    new_offset: int | None = None
+    inode: int | None = None
+    caught_up: bool = False
     stats: Stats = Field(default_factory=Stats)
 
 
 class IngestResult(SQLModel):
     files_scanned: int = 0
+    files_skipped: int = 0
     files_failed: int = 0
     total_inserted: int = 0
     total_batches: int = 0
+    total_commits: int = 0
     stats: Stats = Field(default_factory=Stats)
     per_file: dict[str, FileResult] = Field(default_factory=dict)
 
 
 class IngestMetrics(SQLModel):
     files_scanned: int = 0
+    files_skipped: int = 0
     files_failed: int = 0
     total_inserted: int = 0
     total_batches: int = 0
+    total_commits: int = 0
     stats: Stats = Field(default_factory=Stats)
 
     @classmethod
     def from_ingest_result(cls, r: IngestResult) -> IngestMetrics:
         return cls(
             files_scanned=r.files_scanned,
+            files_skipped=r.files_skipped,
             files_failed=r.files_failed,
             total_inserted=r.total_inserted,
             total_batches=r.total_batches,
+            total_commits=r.total_commits,
             stats=Stats(**r.stats.model_dump()),
         )
 
 
+class PushMetrics(SQLModel):
+    queued_events: int = 0
+    accepted_events: int = 0
+    rejected_requests: int = 0
+    written_events: int = 0
+    failed_events: int = 0
+    socket_connections: int = 0
+
+
+class StorageMetrics(SQLModel):
+    wal_bytes: int = 0
+    wal_frames: int = 0
+    wal_checkpointed_frames: int = 0
+    checkpoint_lag_frames: int = 0
+    last_checkpoint_at: datetime | None = None
+
+
+class PushResult(SQLModel):
+    accepted: int = 0
+    stats: Stats = Field(default_factory=Stats)
+
+
 class IngestState(SQLModel):
     started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     metrics_total: IngestMetrics = Field(default_factory=IngestMetrics)
     metrics_last: IngestMetrics = Field(default_factory=IngestMetrics)
+    batch_sizes: dict[str, int] = Field(default_factory=dict)
+    push: PushMetrics | None = None
+    storage: StorageMetrics = Field(default_factory=StorageMetrics)
 
     last_ingest_ok_at: datetime | None = None
     last_ingest_error: str | None = None
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from sqlalchemy import Table, event
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from config import settings
+from db import db_engine, init_db
+from ingest.ingest import ingest_once
+from ingest.pipeline import ParsePipeline
+from repositories.fts import create_fts, drop_fts
+from repositories.partitions import (
+    defer_indexes,
+    list_partitions,
+    partition_table,
+    secondary_indexes,
+)
+
+from models.models import DictValue, Event, FileFingerprint, FileOffset  # noqa: F401
+
+# Bulk-load profile: no fsync, rollback journal kept in memory. A crash
+# during the backfill can corrupt the database, so run it with the service
+# stopped and a backup at hand.
+BULK_PRAGMAS: tuple[str, ...] = (
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+)
+
+
+def _apply_bulk_pragmas(dbapi_conn: sqlite3.Connection, _record: object) -> None:
+    for pragma in BULK_PRAGMAS:
+        _ = dbapi_conn.execute(pragma)
+
+
+def _events_tables(conn: Connection) -> list[Table]:
+    tables = [SQLModel.metadata.tables[Event.__tablename__]]
+    if settings.SIEM_PARTITION_ENABLED:
+        tables += [partition_table(day) for day in list_partitions(conn)]
+    return tables
+
+
+def _drop_indexes(conn: Connection) -> None:
+    for table in _events_tables(conn):
+        for index in secondary_indexes(table):
+            print(f"[backfill] dropping index {index.name}")
+            index.drop(conn, checkfirst=True)
+        # Its triggers would index every row as it is inserted.
+        if settings.SIEM_FTS_ENABLED:
+            print(f"[backfill] dropping full-text index of {table.name}")
+            drop_fts(conn, table.name)
+
+
+def _build_indexes(conn: Connection) -> None:
+    for table in _events_tables(conn):
+        for index in secondary_indexes(table):
+            print(f"[backfill] rebuilding index {index.name}")
+            index.create(conn, checkfirst=True)
+        if settings.SIEM_FTS_ENABLED:
+            print(f"[backfill] rebuilding full-text index of {table.name}")
+            _ = create_fts(conn, table.name)
+
+
+def _journal_mode(engine: Engine) -> str:
+    with engine.connect() as conn:
+        return str(conn.exec_driver_sql("PRAGMA journal_mode").scalar())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Bulk-load a directory of JSONL logs into the events table."
+    )
+    parser.add_argument(
+        "log_dir",
+        nargs="?",
+        default=settings.SIEM_LOG_DIR,
+        help="Directory to load (default: SIEM_LOG_DIR).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Parse worker processes.",
+    )
+    parser.add_argument(
+        "--reader-threads", type=int, default=4, help="Files read concurrently."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="Lines per parse batch."
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=500000,
+        help="Commit once this many events are pending.",
+    )
+    parser.add_argument(
+        "--keep-indexes",
+        action="store_true",
+        help="Do not drop and rebuild the secondary and full-text indexes.",
+    )
+    args = parser.parse_args()
+
+    db_path = Path(settings.SIEM_DB_PATH)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    init_db()
+
+    journal_mode = _journal_mode(db_engine)
+    event.listen(db_engine, "connect", _apply_bulk_pragmas)
+    db_engine.dispose()
+
+    pipeline = ParsePipeline(
+        max(args.workers, 1),
+        args.reader_threads,
+        max(args.workers, 1) * 4,
+        settings.SIEM_INGEST_FAST_PARSE,
+    )
+
+    started = perf_counter()
+    try:
+        if not args.keep_indexes:
+            # Partitions the load creates get their indexes at the end too.
+            defer_indexes(True)
+            with db_engine.begin() as conn:
+                _drop_indexes(conn)
+
+        # Offsets are committed together with the events they cover, so the
+        # live ingestor resumes exactly where the backfill stopped.
+        result = ingest_once(
+            args.log_dir,
+            args.batch_size,
+            sys.maxsize,
+            args.commit_every,
+            3600,
+            pipeline=pipeline,
+        )
+        loaded = perf_counter() - started
+        print(
+            f"[backfill] loaded {result.total_inserted} events from "
+            f"{result.files_scanned} files in {loaded:.1f}s "
+            f"({result.total_inserted / max(loaded, 1e-9):.0f} events/s), "
+            f"{result.files_failed} failed"
+        )
+        print(f"[backfill] {result.stats}")
+    finally:
+        pipeline.shutdown()
+        if not args.keep_indexes:
+            defer_indexes(False)
+            with db_engine.begin() as conn:
+                _build_indexes(conn)
+        event.remove(db_engine, "connect", _apply_bulk_pragmas)
+        db_engine.dispose()
+        with db_engine.connect() as conn:
+            _ = conn.exec_driver_sql(f"PRAGMA journal_mode={journal_mode}")
+
+    print(f"[backfill] done in {perf_counter() - started:.1f}s")
+    return 1 if result.files_failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,13 +7,18 @@ from pathlib import Path
 from typing import Callable, cast
 from collections.abc import Sequence
 
-from sqlalchemy import func
+from sqlalchemy.engine import Connection
 from sqlmodel import Session, desc, select
 
 from config import settings
 from db import db_engine, init_db
+from ingest.normalize import build_context, build_event
+from repositories.dictionary import values
+from repositories.events import count_events
+from schemas.event import STORED_COLUMNS, EventRow
+from schemas.incoming import IncomingLogEvent
 
-from models.models import Event, FileOffset  # noqa: F401
+from models.models import DictValue, Event, FileOffset  # noqa: F401
 
 
 def _now_iso() -> str:
@@ -21,7 +26,7 @@ def _now_iso() -> str:
 
 
 def _try_import_repo_functions() -> tuple[
-    Callable[[Session, Sequence[Event]], int] | None,
+    Callable[[Session, Sequence[EventRow]], int] | None,
     Callable[[Session, int], list[Event]] | None,
 ]:
     candidates = [
@@ -37,23 +42,40 @@ def _try_import_repo_functions() -> tuple[
         except Exception:
             continue
 
-        insert_fn = getattr(mod, "insert_events_batch", None)
+        insert_fn = getattr(mod, "insert_event_rows", None)
         query_fn = getattr(mod, "query_latest_events", None)
 
         if callable(insert_fn) and callable(query_fn):
             return (
-                cast(Callable[[Session, Sequence[Event]], int], insert_fn),
+                cast(Callable[[Session, Sequence[EventRow]], int], insert_fn),
                 cast(Callable[[Session, int], list[Event]], query_fn),
             )
 
     return (None, None)
 
 
-def _insert_events_batch_fallback(session: Session, events: Sequence[Event]) -> int:
-    session.add_all(list(events))
+def _insert_events_batch_fallback(session: Session, events: Sequence[EventRow]) -> int:
+    conn = session.connection()
+    session.add_all([Event(**row) for row in _stored_rows(conn, events)])
     return len(events)
 
 
+def _stored_rows(
+    conn: Connection, events: Sequence[EventRow]
+) -> list[dict[str, object]]:
+    return [dict(zip(STORED_COLUMNS, row)) for row in values.encode(conn, events)]
+
+
+def _demo_event(offset: int, **fields: object) -> EventRow:
+    incoming = IncomingLogEvent.model_validate(fields)
+    return build_event(
+        incoming,
+        raw_line=b'{"demo":true}',
+        source_offset=offset,
+        ctx=build_context("demo", "scripts/db_smoke.py"),
+    )
+
+
 def _query_latest_events_fallback(session: Session, limit: int) -> list[Event]:
     stmt = select(Event).order_by(desc(Event.ts), desc(Event.id)).limit(limit)
     return list(session.exec(stmt).all())
@@ -92,23 +114,18 @@ def main() -> int:
                 now = _now_iso()
 
                 demo_events = [
-                    Event(
+                    _demo_event(
+                        0,
                         ts=now,
-                        received_at=now,
-                        app="demo",
                         host="local",
                         level="INFO",
                         event_type="smoke_test",
                         message="hello from db_smoke",
-                        source_file="scripts/db_smoke.py",
-                        source_offset=0,
-                        raw_json='{"demo":true}',
-                        data_json='{"kind":"smoke"}',
+                        data={"kind": "smoke"},
                     ),
-                    Event(
+                    _demo_event(
+                        1,
                         ts=now,
-                        received_at=now,
-                        app="demo",
                         host="local",
                         level="ERROR",
                         event_type="smoke_test_error",
@@ -119,19 +136,25 @@ def main() -> int:
                         http_path="/health",
                         http_status=200,
                         latency_ms=12.3,
-                        source_file="scripts/db_smoke.py",
-                        source_offset=1,
                     ),
                 ]
 
                 inserted = insert_fn(session, demo_events)
                 session.commit()
 
-            # count total
-            total = session.exec(select(func.count()).select_from(Event)).one()
+            # count total, across partitions when enabled
+            total = count_events(session)
 
             # query latest
             rows = query_fn(session, args.limit)
+            strings = values.values_of(
+                session.connection(),
+                (
+                    id
+                    for ev in rows
+                    for id in (ev.app_id, ev.event_type_id, ev.level_id)
+                ),
+            )
 
         except Exception as e:
             session.rollback()
@@ -144,7 +167,7 @@ def main() -> int:
     print(f"[db_smoke] Latest {len(rows)} events:")
     for ev in rows:
         print(
-            f"  - id={ev.id} ts={ev.ts} app={ev.app} type={ev.event_type} level={ev.level} msg={ev.message!r}"
+            f"  - id={ev.id} ts={ev.ts} app={strings.get(ev.app_id or 0)} type={strings.get(ev.event_type_id or 0)} level={strings.get(ev.level_id or 0)} msg={ev.message!r}"
         )
 
     return 0
@@ -0,0 +1,95 @@
+"""A database as the first release created it, for migration tests."""
+
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Sequence
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE events (
+    ts VARCHAR NOT NULL,
+    received_at VARCHAR NOT NULL,
+    app VARCHAR,
+    host VARCHAR,
+    level VARCHAR,
+    event_type VARCHAR,
+    message VARCHAR,
+    request_id VARCHAR,
+    user_id VARCHAR,
+    src_ip VARCHAR,
+    user_agent VARCHAR,
+    http_method VARCHAR,
+    http_path VARCHAR,
+    http_status INTEGER,
+    latency_ms FLOAT,
+    error_type VARCHAR,
+    data_json VARCHAR,
+    raw_json VARCHAR,
+    source_file VARCHAR,
+    source_offset INTEGER,
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT
+);
+CREATE INDEX events_ts_desc ON events (ts);
+CREATE INDEX events_app_ts ON events (app, ts);
+CREATE INDEX events_event_type_ts ON events (event_type, ts);
+CREATE INDEX events_src_ip_ts ON events (src_ip, ts);
+CREATE INDEX events_user_id_ts ON events (user_id, ts);
+CREATE INDEX events_request_id ON events (request_id);
+CREATE TABLE file_offsets (
+    path VARCHAR NOT NULL PRIMARY KEY,
+    inode INTEGER,
+    offset INTEGER,
+    updated_at VARCHAR
+);
+"""
+
+
+def baseline_event(
+    source_offset: int,
+    ts: str = "2026-10-17T12:00:00Z",
+    source_file: str | None = "/logs/app1/app.jsonl",
+    **fields: object,
+) -> dict[str, object]:
+    """An events row of the first release; raw_json is the line itself."""
+    event: dict[str, object] = {
+        "ts": ts,
+        "received_at": ts,
+        "app": "app1",
+        "host": "host1",
+        "level": "info",
+        "event_type": "login",
+        "message": f"line {source_offset}",
+        "http_method": "GET",
+        "data_json": '{"k": 1}',
+        "raw_json": f'{{"ts": "{ts}", "message": "line {source_offset}"}}',
+        "source_file": source_file,
+        "source_offset": source_offset,
+    }
+    event.update(fields)
+    return event
+
+
+def create_baseline_db(
+    path: Path,
+    events: list[dict[str, object]],
+    offsets: Sequence[tuple[str, int, int]] = (),
+) -> None:
+    """Creates the first release's schema with events and (path, inode, offset)."""
+    conn = sqlite3.connect(path)
+    try:
+        _ = conn.executescript(_SCHEMA)
+        for event in events:
+            _ = conn.execute(
+                f"INSERT INTO events ({', '.join(event)}) "
+                f"VALUES ({', '.join('?' for _ in event)})",
+                tuple(event.values()),
+            )
+        _ = conn.executemany(
+            "INSERT INTO file_offsets (path, inode, offset, updated_at) "
+            "VALUES (?, ?, ?, '2026-10-17T12:00:00Z')",
+            offsets,
+        )
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+# config.settings is built on import and needs these.
+os.environ.setdefault("SIEM_ADMIN_PASSWORD_HASH", "test")
+os.environ.setdefault("SIEM_JWT_SECRET", "test")
+os.environ.setdefault("SIEM_CORS_ORIGINS", "[]")
+# Always a scratch database, never one configured in the environment.
+_DB_DIR = Path(tempfile.mkdtemp(prefix="siem-tests-"))
+os.environ["SIEM_DB_PATH"] = str(_DB_DIR / "siem.sqlite3")
+
+
+@pytest.fixture
+def empty_db() -> Iterator[Path]:
+    """
+    Path of a database file that does not exist yet, with the engines and
+    the caches tied to the previous one reset.
+    """
+    from db import db_engine, read_engine
+    from repositories import partitions
+    from repositories.dictionary import values
+
+    def reset() -> None:
+        db_engine.dispose()
+        read_engine.dispose()
+        for path in _DB_DIR.iterdir():
+            path.unlink()
+        values.__init__(values.max_cached)
+        partitions.forget_ensured()
+
+    reset()
+    yield _DB_DIR / "siem.sqlite3"
+    reset()
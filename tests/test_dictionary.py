@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlmodel import Session
+
+from db import db_engine, init_db
+from handlers.events import get_event_details, get_events_all
+from ingest.normalize import build_context
+from ingest.tail import parse_line
+from ingest.utils import dt_to_epoch_us
+from repositories.dictionary import values
+from repositories.events import insert_event_rows
+from schemas.event import DICT_COLUMNS, EventRow
+from schemas.ingest import Stats
+from tests.baseline import baseline_event, create_baseline_db
+
+
+def test_migration_encodes_columns_and_decodes_them_back(empty_db: Path) -> None:
+    create_baseline_db(
+        empty_db,
+        [
+            baseline_event(0, app="app1", host="h1", level="info"),
+            baseline_event(100, app="app2", host="h1", level="error"),
+            baseline_event(200, app="app1", host=None, http_method=None),
+        ],
+    )
+    init_db()
+    with Session(db_engine) as session:
+        conn = session.connection()
+        columns = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(events)")}
+        assert not columns & set(DICT_COLUMNS)
+        assert {f"{c}_id" for c in DICT_COLUMNS} <= columns
+
+        detail = get_event_details(2, session)
+        assert (detail.app, detail.host, detail.level, detail.event_type) == (
+            "app2",
+            "h1",
+            "error",
+            "login",
+        )
+        assert (detail.http_method, detail.source_file) == (
+            "GET",
+            "/logs/app1/app.jsonl",
+        )
+        assert get_event_details(3, session).host is None
+        listed = get_events_all(session, app=["app1"], level=["info"])
+        assert [e.id for e in listed] == [3, 1]
+        assert get_events_all(session, app=["unknown"]) == []
+
+
+def _row(app: str, event_type: str, ts: str, offset: int) -> EventRow:
+    line = (
+        f'{{"ts": "{ts}", "app": "{app}", "event_type": "{event_type}", '
+        f'"level": "info"}}'
+    ).encode()
+    row = parse_line(line, offset, build_context(None, "/logs/a.jsonl"), Stats())
+    assert row is not None
+    return row
+
+
+def test_delete_unused_drops_values_only_expired_events_used(empty_db: Path) -> None:
+    init_db()
+    cutoff_us = dt_to_epoch_us(datetime(2026, 6, 1, tzinfo=timezone.utc))
+    with Session(db_engine) as session:
+        rows = [
+            _row("old", "old_type", "2026-01-01T00:00:00Z", 0),
+            _row("new", "new_type", "2026-10-17T00:00:00Z", 100),
+        ]
+        assert insert_event_rows(session, rows) == 2
+        session.commit()
+
+        # What retention deletes first.
+        conn = session.connection()
+        _ = conn.exec_driver_sql("DELETE FROM events WHERE ts_us < ?", (cutoff_us,))
+        deleted = values.delete_unused(conn, cutoff_us)
+        session.commit()
+        values.forget(deleted)
+        assert {(kind, value) for _, kind, value in deleted} == {
+            ("app", "old"),
+            ("event_type", "old_type"),
+        }
+        assert values.ids_of(session.connection(), "app", ["old"]) == []
+
+        # A value deleted and stored again gets a new id.
+        again = [_row("old", "old_type", "2026-10-17T00:00:00Z", 200)]
+        assert insert_event_rows(session, again) == 1
+        session.commit()
+        (new_id,) = values.ids_of(session.connection(), "app", ["old"])
+        assert new_id not in {id for id, _, _ in deleted}
+        assert [e.app for e in get_events_all(session)] == ["old", "new"]
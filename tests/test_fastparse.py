@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from ingest.fastparse import fast_incoming, loads_line
+from ingest.normalize import NormalizeContext, build_context, build_event
+from ingest.tail import parse_line
+from schemas.incoming import IncomingLogEvent
+from schemas.ingest import Stats
+
+_CORPUS = Path(__file__).with_name("fastparse_corpus.jsonl")
+
+# Too large to keep in the corpus file, or not valid UTF-8.
+_GENERATED: list[bytes] = [
+    json.dumps({"msg": "m" * 100_000}).encode(),
+    json.dumps({"msg": " " * 50_000 + "x"}).encode(),
+    json.dumps(
+        {
+            "user_agent": "Mozilla/5.0 " * 5000,
+            "http_path": "/" + "a" * 20_000,
+            "request_id": "r" * 10_000,
+        }
+    ).encode(),
+    json.dumps({"error_type": "E" * 70_000, "app": "a" * 4096}).encode(),
+    json.dumps({"data": {"blob": "b" * 200_000}}).encode(),
+    json.dumps({"data": list(range(5000))}).encode(),
+    b'{"msg": "\xff\xfe not utf-8"}',
+    b'{"app": "caf\xe9"}',
+    b"\xef\xbb\xbf" + b'{"msg": "utf-8 bom"}',
+]
+
+LINES: list[bytes] = [
+    *_CORPUS.read_bytes().split(b"\n")[:-1],
+    *_GENERATED,
+]
+
+
+def _ctx() -> NormalizeContext:
+    return build_context(
+        "app", "/logs/app/app.jsonl", received_at="2026-10-18T00:00:00Z"
+    )
+
+
+def _loads(line: bytes) -> object:
+    try:
+        return loads_line(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+@pytest.mark.parametrize("line", LINES, ids=range(len(LINES)))
+def test_fast_incoming_matches_model(line: bytes) -> None:
+    parsed = _loads(line)
+    if not isinstance(parsed, dict):
+        pytest.skip("not a JSON object")
+    fast = fast_incoming(parsed)
+    try:
+        model = IncomingLogEvent.model_validate(parsed)
+    except ValidationError:
+        assert fast is None
+        return
+    if fast is None:
+        # Left to the full model, which parse_line falls back to.
+        return
+    ctx = _ctx()
+    # Compared by repr, so that nan equals nan and 0.0 differs from -0.0.
+    assert repr(build_event(fast, raw_line=line, source_offset=0, ctx=ctx)) == repr(
+        build_event(model, raw_line=line, source_offset=0, ctx=ctx)
+    )
+
+
+@pytest.mark.parametrize("line", LINES, ids=range(len(LINES)))
+def test_parse_line_same_with_fast_parse(line: bytes) -> None:
+    ctx = _ctx()
+    fast_stats = Stats()
+    model_stats = Stats()
+    assert repr(parse_line(line, 0, ctx, fast_stats, True)) == repr(
+        parse_line(line, 0, ctx, model_stats, False)
+    )
+    assert fast_stats == model_stats
+
+
+def test_corpus_takes_the_fast_path() -> None:
+    # The differential tests say nothing if every line falls back.
+    fast = [
+        line
+        for line in LINES
+        if isinstance(parsed := _loads(line), dict) and fast_incoming(parsed)
+    ]
+    assert len(fast) > len(LINES) // 2
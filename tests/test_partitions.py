@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+from config import settings
+from db import db_engine, init_db
+from handlers.events import get_event_details, get_events_all
+from ingest.normalize import build_context
+from ingest.tail import parse_line
+from repositories.events import count_events, insert_event_rows, query_latest_events
+from repositories.partitions import (
+    DAY_US,
+    ID_SHIFT,
+    list_partitions,
+    partition_for_id,
+    partition_for_ts_us,
+    partition_name,
+)
+from schemas.event import EventRow
+from schemas.ingest import Stats
+from tests.baseline import baseline_event, create_baseline_db
+
+
+def _rows(*ts: str, start: int = 0) -> list[EventRow]:
+    """Rows of consecutive lines of one file, from line start on."""
+    ctx = build_context("app1", "/logs/app1/app.jsonl")
+    rows: list[EventRow] = []
+    for number, value in enumerate(ts, start):
+        line = f'{{"ts": "{value}", "message": "m{number}"}}'.encode()
+        row = parse_line(line, number * 100, ctx, Stats())
+        assert row is not None
+        rows.append(row)
+    return rows
+
+
+def _today() -> int:
+    return partition_for_ts_us(time.time_ns() // 1000)
+
+
+def _ts(day: int, hour: int = 12) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(day * 86400 + hour * 3600))
+
+
+@pytest.fixture
+def partitioned(empty_db: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "SIEM_PARTITION_ENABLED", True)
+    monkeypatch.setattr(settings, "SIEM_PARTITION_DAYS", 1)
+    init_db()
+
+
+@pytest.mark.usefixtures("partitioned")
+def test_bogus_ts_is_filed_under_today() -> None:
+    now_us = time.time_ns() // 1000
+    today = partition_for_ts_us(now_us)
+    rows = _rows(
+        "9999-12-31T00:00:00Z",
+        "1960-01-01T00:00:00Z",
+        "1970-01-01T00:00:00Z",
+    )
+    with Session(db_engine) as session:
+        assert insert_event_rows(session, rows) == 3
+        session.commit()
+        conn = session.connection()
+        (day,) = list_partitions(conn)
+        # Unless midnight passed since now_us was taken.
+        assert day in (today, today + 1)
+        ids = conn.exec_driver_sql(f"SELECT id FROM {partition_name(day)}").scalars()
+        assert all(id < 2**53 for id in ids)
+        assert count_events(session) == 3
+
+
+@pytest.mark.usefixtures("partitioned")
+def test_ts_in_window_keeps_its_partition() -> None:
+    yesterday_us = time.time_ns() // 1000 - DAY_US
+    ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(yesterday_us / 1e6))
+    with Session(db_engine) as session:
+        assert insert_event_rows(session, _rows(ts)) == 1
+        session.commit()
+        assert list_partitions(session.connection()) == [
+            partition_for_ts_us(yesterday_us)
+        ]
+
+
+def test_migration_keeps_bogus_ts_in_recent_partitions(
+    empty_db: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    init_db()
+    with Session(db_engine) as session:
+        rows = _rows("9999-12-31T00:00:00Z", "1960-01-01T00:00:00Z")
+        assert insert_event_rows(session, rows) == 2
+        session.commit()
+
+    monkeypatch.setattr(settings, "SIEM_PARTITION_ENABLED", True)
+    init_db()
+    with Session(db_engine) as session:
+        (day,) = list_partitions(session.connection())
+        assert day >= partition_for_ts_us(time.time_ns() // 1000)
+        assert count_events(session) == 2
+
+
+@pytest.mark.usefixtures("partitioned")
+def test_ids_are_handed_out_in_the_partition_range() -> None:
+    today = _today()
+    with Session(db_engine) as session:
+        rows = _rows(_ts(today - 1), _ts(today - 2), _ts(today - 1))
+        assert insert_event_rows(session, rows) == 3
+        assert insert_event_rows(session, _rows(_ts(today - 1), start=3)) == 1
+        session.commit()
+        conn = session.connection()
+        for day in (today - 2, today - 1):
+            ids = list(
+                conn.exec_driver_sql(
+                    f"SELECT id FROM {partition_name(day)} ORDER BY id"
+                ).scalars()
+            )
+            first = day << ID_SHIFT
+            assert ids == list(range(first + 1, first + 1 + len(ids)))
+            assert {partition_for_id(id) for id in ids} == {day}
+        assert count_events(session) == 4
+
+
+@pytest.mark.usefixtures("partitioned")
+def test_line_replayed_into_the_next_partition_is_skipped() -> None:
+    today = _today()
+    with Session(db_engine) as session:
+        assert insert_event_rows(session, _rows(_ts(today - 1, 23))) == 1
+        session.commit()
+        # The same line, read again after midnight and filed a day later.
+        replayed = _rows(_ts(today, 0), _ts(today, 1))
+        assert insert_event_rows(session, replayed) == 1
+        session.commit()
+        assert count_events(session) == 2
+
+
+def test_migration_moves_events_into_partitions(
+    empty_db: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    today = _today()
+    create_baseline_db(
+        empty_db,
+        [
+            baseline_event(0, ts=_ts(today - 3)),
+            baseline_event(100, ts=_ts(today - 1)),
+            baseline_event(200, ts=_ts(today - 1, 13), data_json='{"k": 2}'),
+        ],
+    )
+    init_db()
+    monkeypatch.setattr(settings, "SIEM_PARTITION_ENABLED", True)
+    init_db()
+    with Session(db_engine) as session:
+        conn = session.connection()
+        assert list_partitions(conn) == [today - 3, today - 1]
+        assert conn.exec_driver_sql("SELECT count(*) FROM events").scalar() == 0
+        assert count_events(session) == 3
+
+        latest = query_latest_events(session, 1)[0]
+        assert partition_for_id(latest.id) == today - 1
+        detail = get_event_details(latest.id, session)
+        assert (detail.ts, detail.app, detail.data_json) == (
+            _ts(today - 1, 13),
+            "app1",
+            '{"k": 2}',
+        )
+        assert detail.raw_json == baseline_event(200, ts=_ts(today - 1, 13))["raw_json"]
+
+
+@pytest.mark.usefixtures("partitioned")
+def test_listing_walks_partitions_newest_first() -> None:
+    today = _today()
+    with Session(db_engine) as session:
+        ts = [_ts(today - 3), _ts(today - 2, 1), _ts(today - 2, 2), _ts(today - 1)]
+        assert insert_event_rows(session, _rows(*ts)) == 4
+        session.commit()
+
+        page = get_events_all(session, limit=2)
+        assert [e.message for e in page] == ["m3", "m2"]
+        cursor = datetime.fromisoformat(page[-1].ts.replace("Z", "+00:00"))
+        page = get_events_all(session, limit=2, before_ts=cursor, before_id=page[-1].id)
+        assert [e.message for e in page] == ["m1", "m0"]
+
+        from_ = datetime.fromisoformat(ts[1].replace("Z", "+00:00"))
+        to = datetime.fromisoformat(ts[2].replace("Z", "+00:00"))
+        listed = get_events_all(session, from_=from_, to=to)
+        assert [e.message for e in listed] == ["m2", "m1"]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+from db import db_engine, init_db
+from handlers.events import get_event_details
+from repositories.payloads import pack_payload, unpack_payload
+from tests.baseline import baseline_event, create_baseline_db
+
+_VALUES = [
+    "",
+    "x",
+    '{"k": 1}',
+    json.dumps({"message": "login failed", "user_agent": "Mozilla/5.0 " * 20}),
+    "ünïcödé ✓ 日本語 🙂",
+]
+
+
+@pytest.mark.parametrize("level", [0, 1, 6, 9])
+@pytest.mark.parametrize("value", [None, *_VALUES])
+def test_pack_payload_round_trip(value: str | None, level: int) -> None:
+    assert unpack_payload(pack_payload(value, level)) == value
+
+
+def test_pack_payload_stores_plain_when_compression_does_not_help() -> None:
+    assert pack_payload("x", 6) == b"\x00x"
+    long = json.dumps({"message": "a" * 1000})
+    packed = pack_payload(long, 6)
+    assert packed is not None and packed[:1] == b"\x01"
+    assert len(packed) < len(long)
+
+
+def test_pack_payload_replaces_lone_surrogates() -> None:
+    assert unpack_payload(pack_payload("a\ud800b", 6)) == "a?b"
+
+
+def test_migration_moves_inline_payloads(empty_db: Path) -> None:
+    data_json = json.dumps({"k": "v" * 500})
+    create_baseline_db(
+        empty_db,
+        [
+            baseline_event(0, data_json=data_json),
+            baseline_event(100, data_json=None, raw_json=None),
+        ],
+    )
+    init_db()
+    with Session(db_engine) as session:
+        conn = session.connection()
+        columns = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(events)")}
+        assert not columns & {"data_json", "raw_json"}
+
+        detail = get_event_details(1, session)
+        assert detail.data_json == data_json
+        assert detail.raw_json == baseline_event(0)["raw_json"]
+        empty = get_event_details(2, session)
+        assert (empty.data_json, empty.raw_json) == (None, None)
+
+        stored = conn.exec_driver_sql("SELECT id, data_json FROM events_payloads").all()
+        assert [id for id, _ in stored] == [1]
+        assert stored[0][1][:1] == b"\x01"
+
+        # Deleting an event deletes its payload with it.
+        _ = conn.exec_driver_sql("DELETE FROM events WHERE id = 1")
+        count = conn.exec_driver_sql("SELECT count(*) FROM events_payloads").scalar()
+        assert count == 0
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+from config import settings
+from db import db_engine, init_db
+from ingest.ingest import ingest_once
+from repositories.events import count_events
+from tests.baseline import baseline_event, create_baseline_db
+
+_LOG = "/logs/app1/app.jsonl"
+
+
+def test_migration_drops_copies_and_numbers_rotated_files(empty_db: Path) -> None:
+    create_baseline_db(
+        empty_db,
+        [
+            baseline_event(0),
+            baseline_event(100),
+            baseline_event(100),
+            # The file was rotated and a new one wrote a line at offset 0.
+            baseline_event(0, raw_json='{"message": "new file"}'),
+            baseline_event(0, source_file=None),
+        ],
+        [(_LOG, 1, 200)],
+    )
+    init_db()
+    with Session(db_engine) as session:
+        conn = session.connection()
+        assert count_events(session) == 4
+        rows = conn.exec_driver_sql(
+            "SELECT source_offset, source_generation FROM events "
+            "WHERE source_file_id IS NOT NULL ORDER BY id"
+        ).all()
+        assert [tuple(r) for r in rows] == [(0, 0), (100, 0), (0, 1)]
+        generation = conn.exec_driver_sql(
+            "SELECT generation FROM file_offsets WHERE path = ?", (_LOG,)
+        ).scalar()
+        assert generation == 1
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_reingesting_a_file_stores_only_new_lines(
+    empty_db: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    partitioned: bool,
+) -> None:
+    monkeypatch.setattr(settings, "SIEM_PARTITION_ENABLED", partitioned)
+    init_db()
+    log = tmp_path / "app1" / "app.jsonl"
+    log.parent.mkdir()
+    _ = log.write_text("".join(f'{{"message": "m{i}"}}\n' for i in range(3)))
+
+    def replay() -> int:
+        # Forgets how far the file was read, so it is read from the start.
+        with Session(db_engine) as session:
+            _ = session.connection().exec_driver_sql("DELETE FROM file_offsets")
+            session.commit()
+        return ingest_once(str(tmp_path), 100, 10).total_inserted
+
+    assert replay() == 3
+    assert replay() == 0
+    with log.open("a") as f:
+        _ = f.write('{"message": "m3"}\n')
+    assert replay() == 1
+    with Session(db_engine) as session:
+        assert count_events(session) == 4
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlmodel import Session
+
+from db import db_engine, init_db
+from handlers.events import get_events_all
+from ingest.utils import dt_to_epoch_us
+from repositories.events import query_latest_events
+from tests.baseline import baseline_event, create_baseline_db
+
+
+def test_migration_fills_ts_us_from_ts(empty_db: Path) -> None:
+    create_baseline_db(
+        empty_db,
+        [
+            baseline_event(0, ts="2026-10-17T12:00:00Z"),
+            baseline_event(100, ts="2026-10-17T12:00:00.123456Z"),
+            baseline_event(200, ts="2026-10-16T23:59:59.000001Z"),
+        ],
+    )
+    init_db()
+    with Session(db_engine) as session:
+        events = query_latest_events(session, 10)
+        assert [(e.ts, e.ts_us) for e in events] == [
+            (
+                "2026-10-17T12:00:00.123456Z",
+                dt_to_epoch_us(datetime(2026, 10, 17, 12, 0, 0, 123456, timezone.utc)),
+            ),
+            (
+                "2026-10-17T12:00:00Z",
+                dt_to_epoch_us(datetime(2026, 10, 17, 12, tzinfo=timezone.utc)),
+            ),
+            (
+                "2026-10-16T23:59:59.000001Z",
+                dt_to_epoch_us(datetime(2026, 10, 16, 23, 59, 59, 1, timezone.utc)),
+            ),
+        ]
+        listed = get_events_all(
+            session,
+            from_=datetime(2026, 10, 17, tzinfo=timezone.utc),
+            to=datetime(2026, 10, 17, 12, tzinfo=timezone.utc),
+        )
+        assert [e.ts for e in listed] == ["2026-10-17T12:00:00Z"]